@@ -0,0 +1 @@
+"""Benchmarks for trivia api."""
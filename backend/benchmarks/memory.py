@@ -0,0 +1,98 @@
+r"""
+Benchmark memory held per question row by each row representation.
+
+Loads the same questions as ORM instances, as formatted dicts of ORM
+instances (the old read path), as column tuples and as question records,
+and reports the memory held per row while the rows are alive and the peak
+memory per row while loading them. Seed the database with
+``benchmarks.seed`` first, then from the backend folder run::
+
+    python -m benchmarks.memory --database-uri sqlite:////tmp/trivia_bench.db
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from flaskr import create_app
+from flaskr.utils import get_question_records
+
+from models import Question, db, get_database_path, question_columns
+
+
+def get_representations(limit):
+    """
+    Return functions loading given number of questions in each way.
+
+    :param limit:
+    :return: dict of representation name and loader.
+    """
+    def questions():
+        return Question.query.order_by(Question.id).limit(limit)
+
+    return {
+        'orm instances': lambda: questions().all(),
+        'formatted dicts': lambda: [
+            question.format() for question in questions()
+        ],
+        'column tuples': lambda: questions().with_entities(
+            *question_columns
+        ).all(),
+        'question records': lambda: get_question_records(questions()),
+    }
+
+
+def measure(load):
+    """
+    Return bytes held and peak bytes of given loader and number of rows.
+
+    Memory is measured while the rows and the session holding them are
+    still alive, then the session is discarded.
+
+    :param load: function returning a list of rows.
+    :return: held bytes, peak bytes, rows
+    """
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    rows = load()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(rows)
+    del rows
+    db.session.remove()
+    return held, peak, count
+
+
+def main():
+    """
+    Run the benchmark.
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--database-uri',
+                        default=get_database_path('trivia_bench'))
+    parser.add_argument('--limit', type=int, default=10000)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_uri})
+    with app.app_context():
+        # Warm up caches of compiled statements and mapper configuration.
+        for load in get_representations(10).values():
+            measure(load)
+
+        print(f'{"representation":<20}{"rows":>8}{"held/row":>10}'
+              f'{"peak/row":>10}')
+        for name, load in get_representations(args.limit).items():
+            held, peak, rows = measure(load)
+            rows = max(rows, 1)
+            print(f'{name:<20}{rows:>8}{held / rows:>10.0f}'
+                  f'{peak / rows:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
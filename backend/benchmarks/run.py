@@ -0,0 +1,282 @@
+r"""
+Load test the trivia api and compare results with a saved baseline.
+
+Every scenario is driven through the Flask test client and through a real
+WSGI server on a local port. p50/p95/p99 latency, requests per second and
+peak RSS are reported. The peak RSS is the one of the whole process so
+far, so it includes all scenarios run before; run one scenario and driver
+per invocation for its own peak. Seed the database with
+``benchmarks.seed`` first, then from the backend folder run::
+
+    python -m benchmarks.run --database-uri sqlite:////tmp/trivia_bench.db \
+        --save-baseline benchmarks/baselines/sqlite-1k.json
+    python -m benchmarks.run --database-uri sqlite:////tmp/trivia_bench.db \
+        --baseline benchmarks/baselines/sqlite-1k.json
+
+The second command exits with status 1 when a scenario got slower than the
+baseline by more than the tolerance, so it can fail a CI job.
+"""
+
+import argparse
+import json
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.seed import CATEGORIES, WORDS
+
+from flaskr import create_app
+
+from models import Question, db, get_database_path
+
+from sqlalchemy import func
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log every request."""
+
+    def log_request(self, *args, **kwargs):
+        """Skip the access log, it would dominate the benchmark output."""
+
+
+def get_scenarios(total_questions):
+    """
+    Return benchmark scenarios as functions building a random request.
+
+    :param total_questions:
+    :return: dict of scenario name and request builder.
+    """
+    pages = max(total_questions // 10, 1)
+
+    def questions_page():
+        return 'GET', f'/questions?page={random.randint(1, pages)}', None
+
+    def search():
+        return 'POST', '/questions/filter', {
+            'searchTerm': random.choice(WORDS), 'page': 1
+        }
+
+    def category_questions():
+        category_id = random.randint(1, len(CATEGORIES))
+        return 'GET', f'/categories/{category_id}/questions?page=1', None
+
+    def quiz():
+        return 'POST', '/quizzes', {
+            'quiz_category': {'id': random.randint(0, len(CATEGORIES))},
+            'previous_questions': random.sample(
+                range(1, total_questions + 1), min(total_questions, 5)
+            ),
+        }
+
+    return {
+        'questions_page': questions_page,
+        'search': search,
+        'category_questions': category_questions,
+        'quiz': quiz,
+    }
+
+
+def summarize(latencies, elapsed):
+    """
+    Return latency percentiles in milliseconds, throughput and peak RSS.
+
+    The peak RSS is the maximum of the process since it started, not of
+    this run alone.
+
+    :param latencies: seconds of every request.
+    :param elapsed: seconds of the whole run.
+    :return:
+    """
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        'p50_ms': percentiles[49] * 1000,
+        'p95_ms': percentiles[94] * 1000,
+        'p99_ms': percentiles[98] * 1000,
+        'rps': len(latencies) / elapsed,
+        'cumulative_peak_rss_mb': resource.getrusage(
+            resource.RUSAGE_SELF
+        ).ru_maxrss / 1024,
+    }
+
+
+def run_test_client(app, build_request, requests):
+    """
+    Send requests one after another through the Flask test client.
+
+    :param app:
+    :param build_request: function returning method, path and JSON body.
+    :param requests: number of requests.
+    :return:
+    """
+    client = app.test_client()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        method, path, body = build_request()
+        start = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {path}: {response.status_code}')
+
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_wsgi_server(base_url, build_request, requests, concurrency):
+    """
+    Send concurrent requests to a WSGI server over HTTP.
+
+    :param base_url:
+    :param build_request: function returning method, path and JSON body.
+    :param requests: number of requests.
+    :param concurrency: number of concurrent clients.
+    :return:
+    """
+    def send(_):
+        method, path, body = build_request()
+        data = json.dumps(body).encode() if body is not None else None
+        http_request = urllib.request.Request(
+            base_url + path, data=data, method=method,
+            headers={'Content-Type': 'application/json'}
+        )
+        start = time.perf_counter()
+        with urllib.request.urlopen(http_request) as response:
+            response.read()
+
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(send, range(requests)))
+
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Return descriptions of results worse than baseline beyond tolerance.
+
+    :param results:
+    :param baseline:
+    :param tolerance: allowed relative slowdown, e.g. 0.2 for 20%.
+    :return:
+    """
+    regressions = []
+    for name, drivers in baseline.items():
+        for driver, expected in drivers.items():
+            actual = results.get(name, {}).get(driver)
+            if actual is None:
+                continue
+
+            if actual['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f'{name} ({driver}): p95 {actual["p95_ms"]:.1f} ms, '
+                    f'baseline {expected["p95_ms"]:.1f} ms'
+                )
+
+            if actual['rps'] < expected['rps'] * (1 - tolerance):
+                regressions.append(
+                    f'{name} ({driver}): {actual["rps"]:.0f} rps, '
+                    f'baseline {expected["rps"]:.0f} rps'
+                )
+
+    return regressions
+
+
+def main():
+    """
+    Run the benchmarks.
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--database-uri',
+                        default=get_database_path('trivia_bench'))
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenario', action='append',
+                        help='Scenario to run, all by default.')
+    parser.add_argument('--driver', choices=('test_client', 'wsgi'),
+                        action='append',
+                        help='Driver to use, both by default.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Disable the response cache.')
+    parser.add_argument('--baseline', help='Baseline JSON to compare with.')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--save-baseline', help='Save results as JSON.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    config = {'SQLALCHEMY_DATABASE_URI': args.database_uri}
+    if args.no_cache:
+        config['RESPONSE_CACHE_TTLS'] = {
+            'questions': 0, 'category_questions': 0, 'search': 0
+        }
+
+    app = create_app(config)
+    with app.app_context():
+        total_questions = db.session.query(func.count(Question.id)).scalar()
+
+    scenarios = get_scenarios(total_questions)
+    drivers = args.driver or ['test_client', 'wsgi']
+
+    server = make_server('127.0.0.1', 0, app, threaded=True,
+                         request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = {}
+    print(f'{total_questions} questions')
+    print(f'{"scenario":<20}{"driver":<13}{"p50 ms":>9}{"p95 ms":>9}'
+          f'{"p99 ms":>9}{"rps":>9}{"max RSS MB":>12}')
+    try:
+        for name in args.scenario or scenarios:
+            for driver in drivers:
+                if driver == 'test_client':
+                    result = run_test_client(
+                        app, scenarios[name], args.requests
+                    )
+                else:
+                    result = run_wsgi_server(
+                        base_url, scenarios[name], args.requests,
+                        args.concurrency
+                    )
+
+                results.setdefault(name, {})[driver] = result
+                print(f'{name:<20}{driver:<13}{result["p50_ms"]:>9.2f}'
+                      f'{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+                      f'{result["rps"]:>9.0f}'
+                      f'{result["cumulative_peak_rss_mb"]:>12.1f}')
+    finally:
+        server.shutdown()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(
+                results, json.load(file), args.tolerance
+            )
+
+        for regression in regressions:
+            print(f'Regression: {regression}', file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
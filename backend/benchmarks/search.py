@@ -0,0 +1,80 @@
+"""
+Benchmark substring and full-text search of questions.
+
+Seeds a synthetic questions table in a dedicated PostgreSQL database and
+times both search modes of POST /questions/filter. From the backend folder
+run::
+
+    createdb trivia_bench
+    python -m benchmarks.search --rows 1000000
+"""
+
+import argparse
+import statistics
+import time
+
+from benchmarks.seed import seed_database
+
+from flask import Flask
+
+from flaskr.constants import SEARCH_MODES
+from flaskr.utils import get_all_questions
+
+from models import get_database_path, setup_db, upgrade_db
+
+SEARCH_TERMS = ['river', 'oscar movie', 'largest lake africa', 'symphony']
+
+
+def time_search(term, search_mode, repeat):
+    """
+    Return median milliseconds and number of results of a search.
+
+    :param term:
+    :param search_mode:
+    :param repeat:
+    :return: median_ms, results
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        questions = get_all_questions(query=term, search_mode=search_mode)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings), len(questions)
+
+
+def main():
+    """
+    Run the benchmark.
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-uri',
+                        default=get_database_path('trivia_bench'))
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-seed', action='store_true')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    setup_db(app, args.database_uri)
+    with app.app_context():
+        upgrade_db()
+        if not args.skip_seed:
+            seed_database(args.rows)
+
+        print(f'{"term":<24}{"mode":<12}{"median ms":>12}{"results":>10}')
+        for term in SEARCH_TERMS:
+            for search_mode in SEARCH_MODES:
+                median_ms, results = time_search(
+                    term, search_mode, args.repeat
+                )
+                print(
+                    f'{term:<24}{search_mode:<12}'
+                    f'{median_ms:>12.1f}{results:>10}'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+r"""
+Seed a database with synthetic questions for benchmarks.
+
+Works on SQLite and PostgreSQL. The database is overwritten. From the
+backend folder run::
+
+    python -m benchmarks.seed --scale 100k \
+        --database-uri sqlite:////tmp/trivia_bench.db
+"""
+
+import argparse
+import random
+
+from flask import Flask
+
+from models import (
+    Category, Question, db, get_database_path, setup_db, upgrade_db
+)
+
+from sqlalchemy import text
+
+SCALES = {
+    '1k': 1000,
+    '100k': 100000,
+    '1m': 1000000,
+}
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+              'Sports']
+
+WORDS = [
+    'the', 'largest', 'river', 'world', 'capital', 'country', 'painter',
+    'movie', 'oscar', 'soccer', 'cup', 'element', 'planet', 'organ', 'human',
+    'body', 'invented', 'discovered', 'author', 'novel', 'king', 'empire',
+    'mountain', 'lake', 'africa', 'europe', 'ocean', 'island', 'battle',
+    'century', 'composer', 'symphony', 'actor', 'director', 'team', 'player',
+]
+
+BATCH_SIZE = 10000
+
+
+def get_rows(value):
+    """
+    Return number of questions of given scale name or number.
+
+    :param value:
+    :return:
+    """
+    return SCALES.get(value.lower()) or int(value)
+
+
+def insert_postgres_questions(rows):
+    """
+    Insert synthetic questions generated by PostgreSQL.
+
+    :param rows:
+    :return:
+    """
+    db.session.execute(text(
+        "INSERT INTO questions (question, answer, category, difficulty) "
+        "SELECT array_to_string(ARRAY("
+        "    SELECT (:words)[1 + floor(random() * :word_count)::int]"
+        "    FROM generate_series(1, 6 + i % 6)"
+        "), ' '), 'answer ' || i, 1 + i % 6, 1 + i % 5 "
+        "FROM generate_series(1, :rows) AS i"
+    ), {'words': WORDS, 'word_count': len(WORDS), 'rows': rows})
+
+
+def insert_questions(rows):
+    """
+    Insert synthetic questions in batches.
+
+    :param rows:
+    :return:
+    """
+    insert = Question.__table__.insert()
+    for start in range(0, rows, BATCH_SIZE):
+        db.session.execute(insert, [
+            {
+                'question': ' '.join(random.choices(WORDS, k=6 + i % 6)),
+                'answer': f'answer {i}',
+                'category': 1 + i % len(CATEGORIES),
+                'difficulty': 1 + i % 5,
+            }
+            for i in range(start, min(start + BATCH_SIZE, rows))
+        ])
+
+
+def seed_database(rows):
+    """
+    Replace categories and questions with synthetic data.
+
+    :param rows: number of questions.
+    :return:
+    """
+    is_postgres = db.engine.dialect.name == 'postgresql'
+    if is_postgres:
+        db.session.execute(
+            text('TRUNCATE questions, categories RESTART IDENTITY')
+        )
+    else:
+        db.session.execute(Question.__table__.delete())
+        db.session.execute(Category.__table__.delete())
+
+    db.session.execute(Category.__table__.insert(), [
+        {'id': category_id, 'type': category_type}
+        for category_id, category_type in enumerate(CATEGORIES, start=1)
+    ])
+
+    if is_postgres:
+        insert_postgres_questions(rows)
+    else:
+        insert_questions(rows)
+
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def main():
+    """
+    Seed the database.
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-uri',
+                        default=get_database_path('trivia_bench'))
+    parser.add_argument('--scale', default='1k',
+                        help='1k, 100k, 1m or a number of questions.')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    setup_db(app, args.database_uri)
+    with app.app_context():
+        upgrade_db()
+        seed_database(get_rows(args.scale))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+r"""
+Benchmark large list responses, where serialization dominates.
+
+Times full category and search responses through the Flask test client,
+with the response cache disabled. Seed the database with
+``benchmarks.seed`` first, then from the backend folder run::
+
+    python -m benchmarks.serialization \
+        --database-uri sqlite:////tmp/trivia_bench.db
+"""
+
+import argparse
+import statistics
+import time
+
+from flaskr import create_app
+
+from models import get_database_path
+
+
+def time_request(client, method, path, body, repeat):
+    """
+    Return median seconds and body size of given request.
+
+    :param client: Flask test client.
+    :param method:
+    :param path:
+    :param body: JSON body or None.
+    :param repeat:
+    :return: seconds, size
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings), len(response.get_data())
+
+
+def main():
+    """
+    Run the benchmark.
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--database-uri',
+                        default=get_database_path('trivia_bench'))
+    parser.add_argument('--json-provider',
+                        help='JSON_PROVIDER setting, best available '
+                             'by default.')
+    parser.add_argument('--search-term', default='river')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    config = {
+        'SQLALCHEMY_DATABASE_URI': args.database_uri,
+        'RESPONSE_CACHE_TTLS': {'category_questions': 0, 'search': 0},
+        'SLOW_REQUEST_THRESHOLD_MS': float('inf'),
+    }
+    if args.json_provider:
+        config['JSON_PROVIDER'] = args.json_provider
+
+    app = create_app(config)
+    client = app.test_client()
+    requests = {
+        'category': ('GET', '/categories/1/questions', None),
+        'search': ('POST', '/questions/filter',
+                   {'searchTerm': args.search_term}),
+    }
+
+    print(f'JSON provider: {type(app.json).__name__}')
+    for name, (method, path, body) in requests.items():
+        seconds, size = time_request(client, method, path, body, args.repeat)
+        print(f'{name:<10}{seconds * 1000:>10.1f} ms{size / 1024:>10.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,275 @@
 """Module for app."""
 
-import random
+import codecs
+from collections.abc import Mapping
 
-from flask import Flask, abort, jsonify, request
+from flask import (
+    Flask, abort, current_app, jsonify, request, stream_with_context
+)
 
 from flask_cors import CORS
 
+from flaskr.auth import admin_required
+from flaskr.cache import (
+    CategoryCache, cached, create_response_cache, get_category_cache
+)
+from flaskr.cli import (
+    export_questions_command, import_questions_command, invalidate_questions,
+    upgrade_db_command
+)
+from flaskr.compression import (
+    encoded_response, init_app as init_compression, iter_compress,
+    negotiate_encoding
+)
+from flaskr.conditional import conditional
 from flaskr.constants import (
-    ERROR_MESSAGES, STATUS_BAD_REQUEST, STATUS_CREATED, STATUS_FORBIDDEN,
-    STATUS_INTERNAL_SERVER_ERROR, STATUS_METHOD_NOT_ALLOWED, STATUS_NOT_FOUND,
-    STATUS_NO_CONTENT, STATUS_UNAUTHORIZED, STATUS_UNPROCESSABLE_ENTITY
+    BULK_UPDATE_FIELDS, CATEGORY_CACHE_TTL, CSV_MIMETYPE, ERROR_MESSAGES,
+    EXPORT_FORMATS, EXPORT_FORMAT_NDJSON, MAX_BULK_QUESTIONS,
+    MAX_QUESTIONS_PER_PAGE, MAX_QUIZ_QUESTIONS, NDJSON_MIMETYPE,
+    PROMETHEUS_MIMETYPE, QUESTIONS_PER_PAGE, QUESTION_INDEX_TTL,
+    QUIZ_STRATEGIES, QUIZ_STRATEGY_UNIFORM, SEARCH_MODES,
+    SEARCH_MODE_SUBSTRING, STATUS_BAD_REQUEST, STATUS_CREATED,
+    STATUS_FORBIDDEN, STATUS_INTERNAL_SERVER_ERROR, STATUS_METHOD_NOT_ALLOWED,
+    STATUS_NOT_FOUND, STATUS_NO_CONTENT, STATUS_UNAUTHORIZED,
+    STATUS_UNPROCESSABLE_ENTITY
+)
+from flaskr.exporter import (
+    get_export_mimetype, get_export_query, iter_export
 )
+from flaskr.importer import (
+    import_questions, parse_csv, parse_json, parse_ndjson
+)
+from flaskr.json_provider import create_json_provider
+from flaskr.metrics import format_gauges, init_app as init_metrics
+from flaskr.question_index import QuestionIndex
+from flaskr.quiz import get_random_question, get_random_questions
+from flaskr.replicas import init_app as init_replicas, read_replica
+from flaskr.sampling import QuestionSampler
+from flaskr.sessions import InMemoryQuizSessionBackend, QuizSession
 from flaskr.utils import (
-    add_new_question, get_all_categories, get_all_questions,
-    get_category_by_id, get_question_by_id, get_questions_by_page
+    add_new_question, count_questions, get_all_categories,
+    get_category_by_id, get_question_by_id, get_question_categories,
+    get_question_ids,
+    get_question_record, get_question_records, get_questions_after,
+    get_questions_by_page, get_questions_page, get_questions_query,
+    get_total_questions, iter_questions
 )
 
-from models import setup_db
+from models import Category, Question, get_pool_stats, setup_db
+
+
+def get_cursor_args():
+    """
+    Return cursor arguments of the current request.
+
+    :return: after_id, limit
+    """
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', QUESTIONS_PER_PAGE, type=int)
+
+    if after_id is None or not 0 < limit <= MAX_QUESTIONS_PER_PAGE:
+        abort(STATUS_BAD_REQUEST)
+
+    return after_id, limit
+
+
+def get_page_args(args):
+    """
+    Return page arguments from given request arguments or body.
+
+    :param args:
+    :return: page, limit
+    """
+    try:
+        page = int(args.get('page'))
+        limit = int(args.get('limit', QUESTIONS_PER_PAGE))
+    except (TypeError, ValueError):
+        abort(STATUS_BAD_REQUEST)
+
+    if not 0 < limit <= MAX_QUESTIONS_PER_PAGE:
+        abort(STATUS_BAD_REQUEST)
+
+    return page, limit
+
+
+def get_bulk_ids(args):
+    """
+    Return question ids of a bulk request body.
+
+    :param args:
+    :return:
+    """
+    question_ids = args.get('ids')
+    if not isinstance(question_ids, list) \
+            or not 0 < len(question_ids) <= MAX_BULK_QUESTIONS:
+        abort(STATUS_BAD_REQUEST)
+
+    try:
+        return sorted({int(question_id) for question_id in question_ids})
+    except (TypeError, ValueError):
+        abort(STATUS_BAD_REQUEST)
+
+
+def get_quiz_count(args):
+    """
+    Return number of quiz questions asked in given request body.
+
+    :param args:
+    :return:
+    """
+    try:
+        count = int(args.get('count'))
+    except (TypeError, ValueError):
+        abort(STATUS_BAD_REQUEST)
+
+    if not 0 < count <= MAX_QUIZ_QUESTIONS:
+        abort(STATUS_BAD_REQUEST)
+
+    return count
+
+
+def get_quiz_category_id(args):
+    """
+    Return id of category asked in given request body or abort with 400.
+
+    :param args:
+    :return: category id, 0 for all categories.
+    """
+    quiz_category = args.get('quiz_category')
+    if not quiz_category or not isinstance(quiz_category, dict):
+        abort(STATUS_BAD_REQUEST)
+
+    try:
+        return int(quiz_category.get('id') or 0)
+    except (TypeError, ValueError):
+        abort(STATUS_BAD_REQUEST)
+
+
+def get_previous_questions(args):
+    """
+    Return ids of questions asked before in given request body.
+
+    :param args:
+    :return: list of question ids.
+    """
+    previous_questions = args.get('previous_questions', [])
+    if not isinstance(previous_questions, list):
+        abort(STATUS_BAD_REQUEST)
+
+    try:
+        return [int(question_id) for question_id in previous_questions]
+    except (TypeError, ValueError):
+        abort(STATUS_BAD_REQUEST)
+
+
+def get_quiz_difficulty(args):
+    """
+    Return difficulty range asked in given request body.
+
+    Difficulty is a number or an object with optional min and max.
+
+    :param args:
+    :return: smallest and largest difficulty or None for all.
+    """
+    difficulty = args.get('difficulty')
+    if difficulty is None:
+        return None
+
+    if not isinstance(difficulty, dict):
+        difficulty = {'min': difficulty, 'max': difficulty}
+
+    try:
+        low, high = (
+            None if difficulty.get(name) is None else int(difficulty[name])
+            for name in ('min', 'max')
+        )
+    except (TypeError, ValueError):
+        abort(STATUS_BAD_REQUEST)
+
+    if low is not None and high is not None and low > high:
+        abort(STATUS_BAD_REQUEST)
+
+    return low, high
+
+
+def get_quiz_strategy(args):
+    """
+    Return sampling strategy asked in given request body.
+
+    :param args:
+    :return:
+    """
+    strategy = args.get('strategy', QUIZ_STRATEGY_UNIFORM)
+    if strategy not in QUIZ_STRATEGIES:
+        abort(STATUS_BAD_REQUEST)
+
+    return strategy
+
+
+def wants_ndjson():
+    """
+    Return whether the client asked for a NDJSON stream.
+
+    :return:
+    """
+    best_match = request.accept_mimetypes.best_match(
+        [current_app.json.mimetype, NDJSON_MIMETYPE]
+    )
+    return best_match == NDJSON_MIMETYPE
+
+
+def ndjson_response(rows):
+    """
+    Return streamed response with a JSON document per line for given rows.
+
+    :param rows: iterable of serializable rows.
+    :return:
+    """
+    dumps = current_app.json.dumps
+    lines = (dumps(row) + '\n' for row in rows)
+    return current_app.response_class(
+        stream_with_context(lines), mimetype=NDJSON_MIMETYPE
+    )
 
 
 def create_app(test_config=None):
     """
     Create and configure the app.
 
-    :param test_config:
+    No database connection is opened, so workers start without waiting for
+    the database. Create or upgrade the schema with the upgrade-db command.
+
+    :param test_config: mapping or object of config overriding the
+        defaults, or a database URI.
     :return:
     """
     app = Flask(__name__)
+    if isinstance(test_config, str):
+        app.config['SQLALCHEMY_DATABASE_URI'] = test_config
+    elif isinstance(test_config, Mapping):
+        app.config.from_mapping(test_config)
+    elif test_config is not None:
+        app.config.from_object(test_config)
+
+    app.json = create_json_provider(app)
     setup_db(app)
 
+    app.extensions['category_cache'] = CategoryCache(
+        app.config.get('CATEGORY_CACHE_TTL', CATEGORY_CACHE_TTL)
+    )
+    app.extensions['quiz_sessions'] = InMemoryQuizSessionBackend()
+    app.extensions['question_index'] = QuestionIndex(
+        app.config.get('QUESTION_INDEX_TTL', QUESTION_INDEX_TTL)
+    )
+    app.extensions['question_sampler'] = QuestionSampler()
+    app.extensions['response_cache'] = create_response_cache(app.config)
+    init_metrics(app)
+    init_compression(app)
+    init_replicas(app)
+    app.cli.add_command(export_questions_command)
+    app.cli.add_command(import_questions_command)
+    app.cli.add_command(upgrade_db_command)
+
     CORS(app, resources={r"*": {"origins": "*"}})
 
     @app.after_request
@@ -44,6 +285,8 @@ def create_app(test_config=None):
         return response
 
     @app.route('/categories')
+    @read_replica
+    @conditional(Category.__tablename__)
     def get_categories():
         """
         Return the categories with id and type.
@@ -51,16 +294,18 @@ def create_app(test_config=None):
         :return:
         """
         try:
-            result = {
-                "success": True,
-                "categories": get_all_categories()
-            }
-            return jsonify(result)
+            category_cache = get_category_cache()
+            return encoded_response(*category_cache.get_encoded_response_data(
+                negotiate_encoding()
+            ))
 
         except Exception as exp:
             abort(exp.code)
 
     @app.route('/questions')
+    @read_replica
+    @conditional(Question.__tablename__, Category.__tablename__)
+    @cached('questions', 'questions', 'categories')
     def get_questions():
         """
         Get questions by given page number.
@@ -68,6 +313,18 @@ def create_app(test_config=None):
         :return:
         """
         try:
+            if 'after_id' in request.args:
+                after_id, limit = get_cursor_args()
+                questions, next_cursor = get_questions_after(after_id, limit)
+                return jsonify({
+                    'success': True,
+                    'current_category': None,
+                    'categories': get_all_categories(),
+                    'questions': questions,
+                    'total_questions': get_total_questions(),
+                    'next_cursor': next_cursor
+                })
+
             page = request.args.get('page', 1, type=int)
             questions = get_questions_by_page(page)
 
@@ -79,7 +336,7 @@ def create_app(test_config=None):
                 'current_category': None,
                 'categories': get_all_categories(),
                 'questions': questions,
-                'total_questions': len(get_all_questions())
+                'total_questions': get_total_questions()
             })
 
         except Exception as exp:
@@ -99,6 +356,9 @@ def create_app(test_config=None):
                 abort(STATUS_NOT_FOUND)
 
             question.delete()
+            app.extensions['response_cache'].invalidate_questions(
+                [question.category]
+            )
             return jsonify({
                 'success': True
             }), STATUS_NO_CONTENT
@@ -120,6 +380,9 @@ def create_app(test_config=None):
                 abort(STATUS_BAD_REQUEST)
 
             instance = add_new_question(question)
+            app.extensions['response_cache'].invalidate_questions(
+                [instance.category]
+            )
             return jsonify({
                 'success': True,
                 'id': instance.id
@@ -128,7 +391,107 @@ def create_app(test_config=None):
         except Exception as exp:
             abort(exp.code)
 
+    @app.route('/questions/bulk', methods=['POST'])
+    def bulk_add_questions():
+        """
+        Add questions from a JSON array, NDJSON or CSV body.
+
+        :return:
+        """
+        try:
+            lines = codecs.iterdecode(request.stream, 'utf-8')
+            if request.mimetype == NDJSON_MIMETYPE:
+                rows = parse_ndjson(lines)
+            elif request.mimetype == CSV_MIMETYPE:
+                rows = parse_csv(lines)
+            elif request.is_json:
+                rows = parse_json(request.get_json())
+            else:
+                abort(STATUS_BAD_REQUEST)
+
+            result = import_questions(rows, on_commit=invalidate_questions)
+            return jsonify({
+                'success': True,
+                **result
+            }), STATUS_CREATED
+
+        except ValueError:
+            abort(STATUS_BAD_REQUEST)
+
+        except Exception as exp:
+            abort(exp.code)
+
+    @app.route('/questions/bulk', methods=['PATCH'])
+    def bulk_update_questions():
+        """
+        Set category or difficulty of questions of given ids.
+
+        :return:
+        """
+        try:
+            request_data = request.get_json()
+            if not isinstance(request_data, dict):
+                abort(STATUS_BAD_REQUEST)
+
+            question_ids = get_bulk_ids(request_data)
+            values = {
+                name: request_data[name] for name in BULK_UPDATE_FIELDS
+                if name in request_data
+            }
+            if not values or not all(
+                    isinstance(value, int) and not isinstance(value, bool)
+                    for value in values.values()):
+                abort(STATUS_BAD_REQUEST)
+
+            if 'category' in values \
+                    and not get_category_by_id(values['category']):
+                abort(STATUS_UNPROCESSABLE_ENTITY)
+
+            category_ids = get_question_categories(question_ids)
+            if 'category' in values:
+                category_ids.add(values['category'])
+
+            updated = Question.update(question_ids, **values)
+            app.extensions['response_cache'].invalidate_questions(
+                category_ids
+            )
+            return jsonify({
+                'success': True,
+                'updated': updated
+            })
+
+        except Exception as exp:
+            abort(exp.code)
+
+    @app.route('/questions/bulk', methods=['DELETE'])
+    def bulk_delete_questions():
+        """
+        Delete questions of given ids.
+
+        :return:
+        """
+        try:
+            request_data = request.get_json()
+            if not isinstance(request_data, dict):
+                abort(STATUS_BAD_REQUEST)
+
+            question_ids = get_bulk_ids(request_data)
+            category_ids = get_question_categories(question_ids)
+            deleted = Question.delete_many(question_ids)
+            app.extensions['response_cache'].invalidate_questions(
+                category_ids
+            )
+            return jsonify({
+                'success': True,
+                'deleted': deleted
+            })
+
+        except Exception as exp:
+            abort(exp.code)
+
     @app.route('/questions/filter', methods=['POST'])
+    @read_replica
+    @cached('search', 'search')
     def search_questions():
         """
         Return the list of questions filtered by given search.
@@ -137,9 +500,28 @@ def create_app(test_config=None):
         """
         try:
             request_data = request.get_json()
-            questions = get_all_questions(
-                query=request_data.get('searchTerm')
+            search_mode = request_data.get(
+                'searchMode', SEARCH_MODE_SUBSTRING
+            )
+            if search_mode not in SEARCH_MODES:
+                abort(STATUS_BAD_REQUEST)
+
+            questions = get_questions_query(
+                query=request_data.get('searchTerm'),
+                search_mode=search_mode
             )
+            if wants_ndjson():
+                return ndjson_response(iter_questions(questions))
+
+            if 'page' in request_data:
+                page, limit = get_page_args(request_data)
+                return jsonify({
+                    'success': True,
+                    'questions': get_questions_page(questions, page, limit),
+                    'total_questions': count_questions(questions),
+                })
+
+            questions = get_question_records(questions)
             return jsonify({
                 'success': True,
                 'questions': questions,
@@ -149,7 +531,46 @@ def create_app(test_config=None):
         except Exception as exp:
             abort(exp.code)
 
+    @app.route('/questions/export')
+    @read_replica
+    def export_questions():
+        """
+        Stream all questions or questions of a category as NDJSON or CSV.
+
+        :return:
+        """
+        try:
+            export_format = request.args.get('format', EXPORT_FORMAT_NDJSON)
+            category_id = request.args.get('category', type=int)
+            if export_format not in EXPORT_FORMATS:
+                abort(STATUS_BAD_REQUEST)
+
+            if category_id and get_category_by_id(category_id) is None:
+                abort(STATUS_NOT_FOUND)
+
+            chunks = iter_export(get_export_query(category_id), export_format)
+            encoding = negotiate_encoding()
+            if encoding:
+                chunks = iter_compress(chunks, encoding)
+
+            response = app.response_class(
+                stream_with_context(chunks),
+                mimetype=get_export_mimetype(export_format)
+            )
+            response.vary.add('Accept-Encoding')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            response.headers['Content-Disposition'] = \
+                f'attachment; filename=questions.{export_format}'
+            return response
+
+        except Exception as exp:
+            abort(exp.code)
+
     @app.route('/categories/<int:category_id>/questions')
+    @read_replica
+    @conditional(Question.__tablename__, Category.__tablename__)
+    @cached('category_questions', 'category:{category_id}', 'categories')
     def get_questions_by_category(category_id):
         """
         Get questions by category.
@@ -163,18 +584,45 @@ def create_app(test_config=None):
             if category is None:
                 abort(STATUS_NOT_FOUND)
 
-            questions = get_all_questions(category_id=category_id)
+            if 'after_id' in request.args:
+                after_id, limit = get_cursor_args()
+                questions, next_cursor = get_questions_after(
+                    after_id, limit, category_id=category_id
+                )
+                return jsonify({
+                    "success": True,
+                    "questions": questions,
+                    "total_questions": get_total_questions(category_id),
+                    "current_category": category,
+                    "next_cursor": next_cursor,
+                })
+
+            questions = get_questions_query(category_id=category_id)
+            if wants_ndjson():
+                return ndjson_response(iter_questions(questions))
+
+            if 'page' in request.args:
+                page, limit = get_page_args(request.args)
+                return jsonify({
+                    "success": True,
+                    "questions": get_questions_page(questions, page, limit),
+                    "total_questions": get_total_questions(category_id),
+                    "current_category": category,
+                })
+
+            questions = get_question_records(questions)
             return jsonify({
                 "success": True,
                 "questions": questions,
                 "total_questions": len(questions),
-                "current_category": category.format(),
+                "current_category": category,
             })
 
         except Exception as exp:
             abort(exp.code)
 
     @app.route('/quizzes', methods=['POST'])
+    @read_replica
     def play_quiz():
         """
         Play quiz route to get questions for quizzes.
@@ -183,31 +631,204 @@ def create_app(test_config=None):
         """
         try:
             request_data = request.get_json()
-            previous_questions = request_data.get('previous_questions', [])
-            quiz_category = request_data.get('quiz_category')
+            category_id = get_quiz_category_id(request_data)
+            previous_questions = get_previous_questions(request_data)
+            difficulty = get_quiz_difficulty(request_data)
+            strategy = get_quiz_strategy(request_data)
+            if 'count' in request_data:
+                return jsonify({
+                    'questions': get_random_questions(
+                        category_id=category_id,
+                        previous_questions=previous_questions,
+                        count=get_quiz_count(request_data),
+                        difficulty=difficulty,
+                        strategy=strategy
+                    ),
+                    'success': True
+                })
+
+            random_question = get_random_question(
+                category_id=category_id,
+                previous_questions=previous_questions,
+                difficulty=difficulty,
+                strategy=strategy
+            )
 
-            if not quiz_category:
-                abort(STATUS_BAD_REQUEST)
+            return jsonify({
+                'question': random_question,
+                'success': True
+            })
 
-            category_id = quiz_category.get('id', 0)
-            if category_id == 0:
-                questions = get_all_questions()
-            else:
-                questions = get_all_questions(category_id=category_id)
+        except Exception as exp:
+            abort(exp.code)
 
-            filtered_questions = list(
-                filter(
-                    lambda question:
-                    question.get('id') not in previous_questions, questions
-                )
-            )
+    @app.route('/quizzes/sessions', methods=['POST'])
+    @read_replica
+    def start_quiz_session():
+        """
+        Start quiz session asking questions of given category.
 
-            random_question = random.choice(filtered_questions) \
-                if filtered_questions else None
+        :return:
+        """
+        try:
+            request_data = request.get_json()
+            category_id = get_quiz_category_id(request_data)
+            session = QuizSession.start(get_question_ids(category_id))
+            app.extensions['quiz_sessions'].save(session)
 
             return jsonify({
-                'question': random_question,
+                'success': True,
+                'session_id': session.id,
+                'total_questions': session.remaining
+            }), STATUS_CREATED
+
+        except Exception as exp:
+            abort(exp.code)
+
+    @app.route('/quizzes/<session_id>/next', methods=['POST'])
+    @read_replica
+    def next_quiz_question(session_id):
+        """
+        Return next question of quiz session.
+
+        :param session_id:
+        :return:
+        """
+        try:
+            quiz_sessions = app.extensions['quiz_sessions']
+            session = quiz_sessions.get(session_id)
+            if session is None:
+                abort(STATUS_NOT_FOUND)
+
+            question = None
+            while question is None and session.remaining:
+                question = get_question_record(session.next_question_id())
+
+            quiz_sessions.save(session)
+            return jsonify({
+                'success': True,
+                'question': question,
+                'remaining_questions': session.remaining
+            })
+
+        except Exception as exp:
+            abort(exp.code)
+
+    @app.route('/quizzes/<session_id>', methods=['DELETE'])
+    def end_quiz_session(session_id):
+        """
+        End quiz session.
+
+        :param session_id:
+        :return:
+        """
+        try:
+            quiz_sessions = app.extensions['quiz_sessions']
+            if quiz_sessions.get(session_id) is None:
+                abort(STATUS_NOT_FOUND)
+
+            quiz_sessions.delete(session_id)
+            return jsonify({
                 'success': True
+            }), STATUS_NO_CONTENT
+
+        except Exception as exp:
+            abort(exp.code)
+
+    @app.route('/questions/index')
+    @admin_required
+    def get_question_index():
+        """
+        Return counts of question index.
+
+        With check=1 the index is also compared with the database, which
+        reads the ids of all questions.
+
+        :return:
+        """
+        try:
+            question_index = app.extensions['question_index']
+            result = {
+                'success': True,
+                'index': question_index.get_stats()
+            }
+            if request.args.get('check', 0, type=int):
+                result['check'] = question_index.check()
+
+            return jsonify(result)
+
+        except Exception as exp:
+            abort(exp.code)
+
+    @app.route('/questions/index', methods=['POST'])
+    @admin_required
+    def rebuild_question_index():
+        """
+        Rebuild question index from database.
+
+        :return:
+        """
+        try:
+            question_index = app.extensions['question_index']
+            question_index.rebuild()
+            return jsonify({
+                'success': True,
+                'index': question_index.get_stats()
+            })
+
+        except Exception as exp:
+            abort(exp.code)
+
+    @app.route('/metrics')
+    def get_metrics():
+        """
+        Return request, pool and cache metrics in the Prometheus format.
+
+        :return:
+        """
+        try:
+            lines = app.extensions['metrics'].render()
+            lines += format_gauges('trivia_db_pool', get_pool_stats())
+            lines += format_gauges(
+                'trivia_response_cache',
+                app.extensions['response_cache'].get_stats()
+            )
+            return app.response_class(
+                '\n'.join(lines) + '\n', content_type=PROMETHEUS_MIMETYPE
+            )
+
+        except Exception as exp:
+            abort(exp.code)
+
+    @app.route('/metrics/pool')
+    def get_pool_metrics():
+        """
+        Return statistics of database connection pool.
+
+        :return:
+        """
+        try:
+            replicas = app.extensions['db_replicas']
+            return jsonify({
+                'success': True,
+                'pool': get_pool_stats(),
+                'replicas': replicas.get_stats() if replicas else []
+            })
+
+        except Exception as exp:
+            abort(exp.code)
+
+    @app.route('/metrics/cache')
+    def get_cache_metrics():
+        """
+        Return hit, miss and eviction counters of response cache.
+
+        :return:
+        """
+        try:
+            return jsonify({
+                'success': True,
+                'cache': app.extensions['response_cache'].get_stats()
             })
 
         except Exception as exp:
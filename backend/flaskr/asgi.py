@@ -0,0 +1,685 @@
+"""
+ASGI app serving the trivia api with async handlers.
+
+Queries are built by the same functions as in the WSGI app and run on an
+async connection pool (asyncpg for PostgreSQL, aiosqlite for SQLite), so a
+request waiting for the database does not hold a worker thread. Needs the
+packages in requirements-asgi.txt. Run it with::
+
+    uvicorn --factory flaskr.asgi:create_asgi_app
+"""
+
+import random
+
+from databases import Database
+
+from flaskr import create_app
+from flaskr.constants import (
+    COMPRESS_GZIP_LEVEL, COMPRESS_MIN_SIZE, ERROR_MESSAGES,
+    MAX_QUESTIONS_PER_PAGE, MAX_QUIZ_QUESTIONS, QUESTIONS_PER_PAGE,
+    QUIZ_STRATEGIES, QUIZ_STRATEGY_UNIFORM, SEARCH_MODES,
+    SEARCH_MODE_SUBSTRING, STATUS_BAD_REQUEST, STATUS_CREATED,
+    STATUS_INTERNAL_SERVER_ERROR, STATUS_NOT_FOUND, STATUS_NO_CONTENT,
+    STATUS_OK
+)
+from flaskr.importer import QUESTION_FIELDS
+from flaskr.quiz import (
+    get_id_range_query, get_pivot_queries, get_probe_query, get_quiz_query
+)
+from flaskr.sessions import QuizSession
+from flaskr.utils import (
+    get_count_query, get_cursor_page, get_page_query, get_question_ids_query,
+    get_questions_after_query, get_questions_query
+)
+
+from models import (
+    Category, Question, QuestionRecord, get_async_database_options,
+    question_columns
+)
+
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response
+from starlette.routing import Route
+
+
+class AppContextMiddleware:
+    """
+    Run every request inside an app context of the flask app.
+
+    The query functions, the category cache and the JSON provider of the
+    flask app need it. App contexts live in context variables, so
+    concurrent requests do not share them.
+    """
+
+    def __init__(self, app, flask_app):
+        """
+        Init method.
+
+        :param app: ASGI app.
+        :param flask_app:
+        """
+        self.app = app
+        self.flask_app = flask_app
+
+    async def __call__(self, scope, receive, send):
+        """
+        Call the ASGI app inside an app context.
+
+        :param scope:
+        :param receive:
+        :param send:
+        :return:
+        """
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        with self.flask_app.app_context():
+            await self.app(scope, receive, send)
+
+
+def create_asgi_app(test_config=None):
+    """
+    Create and configure the ASGI app.
+
+    :param test_config: mapping of config overriding the defaults.
+    :return:
+    """
+    flask_app = create_app(test_config)
+    database_uri = flask_app.config['SQLALCHEMY_DATABASE_URI']
+    database = Database(
+        database_uri,
+        **get_async_database_options(flask_app.config, database_uri)
+    )
+    category_cache = flask_app.extensions['category_cache']
+    quiz_sessions = flask_app.extensions['quiz_sessions']
+    response_cache = flask_app.extensions['response_cache']
+
+    def json_response(data, status_code=STATUS_OK):
+        """
+        Return JSON response serialized like the flask app does.
+
+        :param data:
+        :param status_code:
+        :return:
+        """
+        return Response(
+            flask_app.json.response(data).get_data(),
+            status_code=status_code, media_type=flask_app.json.mimetype
+        )
+
+    async def get_json(request):
+        """
+        Return parsed JSON body of given request.
+
+        :param request:
+        :return:
+        """
+        try:
+            return await request.json()
+
+        except ValueError:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+    def get_int(args, name, default=None):
+        """
+        Return integer argument or default if missing or not an integer.
+
+        :param args: query parameters or body.
+        :param name:
+        :param default:
+        :return:
+        """
+        try:
+            return int(args[name])
+
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def get_cursor_args(request):
+        """
+        Return cursor arguments of given request.
+
+        :param request:
+        :return: after_id, limit
+        """
+        after_id = get_int(request.query_params, 'after_id')
+        limit = get_int(request.query_params, 'limit', QUESTIONS_PER_PAGE)
+
+        if after_id is None or not 0 < limit <= MAX_QUESTIONS_PER_PAGE:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        return after_id, limit
+
+    def get_page_args(args):
+        """
+        Return page arguments from given request arguments or body.
+
+        :param args:
+        :return: page, limit
+        """
+        page = get_int(args, 'page')
+        limit = get_int(args, 'limit')
+        if 'limit' not in args:
+            limit = QUESTIONS_PER_PAGE
+
+        if page is None or limit is None:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        if not 0 < limit <= MAX_QUESTIONS_PER_PAGE:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        return page, limit
+
+    def get_quiz_difficulty(args):
+        """
+        Return difficulty range asked in given request body.
+
+        :param args:
+        :return: smallest and largest difficulty or None for all.
+        """
+        difficulty = args.get('difficulty')
+        if difficulty is None:
+            return None
+
+        if not isinstance(difficulty, dict):
+            difficulty = {'min': difficulty, 'max': difficulty}
+
+        low, high = (get_int(difficulty, name) for name in ('min', 'max'))
+        for name, value in (('min', low), ('max', high)):
+            if value is None and difficulty.get(name) is not None:
+                raise HTTPException(STATUS_BAD_REQUEST)
+
+        if low is not None and high is not None and low > high:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        return low, high
+
+    async def fetch_questions(questions):
+        """
+        Return question records of given questions query.
+
+        :param questions: questions query.
+        :return:
+        """
+        rows = await database.fetch_all(
+            questions.with_entities(*question_columns).statement
+        )
+        return [QuestionRecord(**row) for row in rows]
+
+    async def fetch_questions_page(questions, page, per_page):
+        """
+        Return question records of given page of questions query.
+
+        :param questions: questions query.
+        :param page:
+        :param per_page:
+        :return:
+        """
+        if page < 1:
+            return []
+
+        return await fetch_questions(
+            get_page_query(questions, page, per_page)
+        )
+
+    async def count_questions(questions):
+        """
+        Return number of questions matched by given questions query.
+
+        :param questions: questions query.
+        :return:
+        """
+        return await database.fetch_val(get_count_query(questions).statement)
+
+    async def fetch_question(question_id):
+        """
+        Return question record by given id.
+
+        :param question_id:
+        :return: question record or None if it does not exist.
+        """
+        questions = await fetch_questions(
+            Question.query.filter(Question.id == question_id)
+        )
+        return questions[0] if questions else None
+
+    async def get_all_categories():
+        """
+        Return categories as dict of id and type, loading them if expired.
+
+        :return:
+        """
+        if category_cache.expired:
+            rows = await database.fetch_all(
+                Category.query.order_by(Category.id).statement
+            )
+            category_cache.update([dict(row) for row in rows])
+
+        return category_cache.get_all()
+
+    async def get_random_questions(category_id=None, previous_questions=(),
+                                   count=1, difficulty=None):
+        """
+        Return given number of distinct random questions not in previous ones.
+
+        Random ids are probed in one query first, the questions it missed
+        are picked from random pivots.
+
+        :param category_id:
+        :param previous_questions: ids of already asked questions.
+        :param count: number of questions.
+        :param difficulty: smallest and largest difficulty or None for all.
+        :return: list of fewer question records if not enough are left.
+        """
+        questions = get_quiz_query(category_id, difficulty)
+        id_range = await database.fetch_one(
+            get_id_range_query(questions).statement
+        )
+        if id_range['min_id'] is None:
+            return []
+
+        id_range = id_range['min_id'], id_range['max_id']
+        previous_questions = set(previous_questions)
+        picked = await fetch_questions(
+            get_probe_query(questions, id_range, count, previous_questions)
+        )
+        previous_questions.update(question.id for question in picked)
+
+        while len(picked) < count:
+            pivot = random.randint(*id_range)
+            for query in get_pivot_queries(
+                    questions, pivot, previous_questions):
+                question = await fetch_questions(query)
+                if question:
+                    picked.append(question[0])
+                    previous_questions.add(question[0].id)
+                    break
+            else:
+                break
+
+        return picked
+
+    def invalidate_questions(category_ids):
+        """
+        Record a write of questions of given categories.
+
+        Table versions are bumped by database triggers of the write.
+
+        :param category_ids:
+        :return:
+        """
+        response_cache.invalidate_questions(category_ids)
+
+    async def get_categories(request):
+        """
+        Return the categories with id and type.
+
+        :param request:
+        :return:
+        """
+        await get_all_categories()
+        return Response(
+            category_cache.get_response_data(),
+            media_type=flask_app.json.mimetype
+        )
+
+    async def get_questions(request):
+        """
+        Get questions by given page number.
+
+        :param request:
+        :return:
+        """
+        if 'after_id' in request.query_params:
+            after_id, limit = get_cursor_args(request)
+            questions, next_cursor = get_cursor_page(
+                await fetch_questions(
+                    get_questions_after_query(after_id, limit)
+                ),
+                limit
+            )
+            return json_response({
+                'success': True,
+                'current_category': None,
+                'categories': await get_all_categories(),
+                'questions': questions,
+                'total_questions': await count_questions(
+                    get_questions_query()
+                ),
+                'next_cursor': next_cursor
+            })
+
+        page = get_int(request.query_params, 'page', 1)
+        questions = await fetch_questions_page(
+            get_questions_query(), page, QUESTIONS_PER_PAGE
+        )
+
+        if len(questions) == 0:
+            raise HTTPException(STATUS_NOT_FOUND)
+
+        return json_response({
+            'success': True,
+            'current_category': None,
+            'categories': await get_all_categories(),
+            'questions': questions,
+            'total_questions': await count_questions(get_questions_query())
+        })
+
+    async def delete_question(request):
+        """
+        Delete question by given question id.
+
+        :param request:
+        :return:
+        """
+        question = await fetch_question(request.path_params['question_id'])
+        if not question:
+            raise HTTPException(STATUS_NOT_FOUND)
+
+        await database.execute(
+            Question.__table__.delete().where(Question.id == question.id)
+        )
+        invalidate_questions([question.category])
+        return Response(status_code=STATUS_NO_CONTENT)
+
+    async def add_question(request):
+        """
+        Add question to database.
+
+        The body must have exactly the question fields, other keys, e.g. an
+        id, are rejected.
+
+        :param request:
+        :return:
+        """
+        question = await get_json(request)
+
+        if not isinstance(question, dict) \
+                or set(question) != set(QUESTION_FIELDS):
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        statement = Question.__table__.insert().values(**question)
+        if database.url.dialect == 'postgresql':
+            statement = statement.returning(Question.id)
+
+        question_id = await database.execute(statement)
+        invalidate_questions([question.get('category')])
+        return json_response({
+            'success': True,
+            'id': question_id
+        }, STATUS_CREATED)
+
+    async def search_questions(request):
+        """
+        Return the list of questions filtered by given search.
+
+        :param request:
+        :return:
+        """
+        request_data = await get_json(request)
+        search_mode = request_data.get('searchMode', SEARCH_MODE_SUBSTRING)
+        if search_mode not in SEARCH_MODES:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        questions = get_questions_query(
+            query=request_data.get('searchTerm'),
+            search_mode=search_mode
+        )
+        if 'page' in request_data:
+            page, limit = get_page_args(request_data)
+            return json_response({
+                'success': True,
+                'questions': await fetch_questions_page(
+                    questions, page, limit
+                ),
+                'total_questions': await count_questions(questions),
+            })
+
+        questions = await fetch_questions(questions)
+        return json_response({
+            'success': True,
+            'questions': questions,
+            'total_questions': len(questions),
+        })
+
+    async def get_questions_by_category(request):
+        """
+        Get questions by category.
+
+        :param request:
+        :return:
+        """
+        category_id = request.path_params['category_id']
+        await get_all_categories()
+        category = category_cache.get(category_id)
+
+        if category is None:
+            raise HTTPException(STATUS_NOT_FOUND)
+
+        questions = get_questions_query(category_id=category_id)
+        if 'after_id' in request.query_params:
+            after_id, limit = get_cursor_args(request)
+            page, next_cursor = get_cursor_page(
+                await fetch_questions(
+                    get_questions_after_query(after_id, limit, category_id)
+                ),
+                limit
+            )
+            return json_response({
+                "success": True,
+                "questions": page,
+                "total_questions": await count_questions(questions),
+                "current_category": category,
+                "next_cursor": next_cursor,
+            })
+
+        if 'page' in request.query_params:
+            page, limit = get_page_args(request.query_params)
+            return json_response({
+                "success": True,
+                "questions": await fetch_questions_page(
+                    questions, page, limit
+                ),
+                "total_questions": await count_questions(questions),
+                "current_category": category,
+            })
+
+        questions = await fetch_questions(questions)
+        return json_response({
+            "success": True,
+            "questions": questions,
+            "total_questions": len(questions),
+            "current_category": category,
+        })
+
+    async def play_quiz(request):
+        """
+        Play quiz route to get questions for quizzes.
+
+        :param request:
+        :return:
+        """
+        request_data = await get_json(request)
+        previous_questions = request_data.get('previous_questions', [])
+        quiz_category = request_data.get('quiz_category')
+
+        if not quiz_category or not isinstance(quiz_category, dict) \
+                or not isinstance(previous_questions, list):
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        category_id = get_int(quiz_category, 'id') \
+            if quiz_category.get('id') else 0
+        previous_questions = [
+            get_int(previous_questions, index)
+            for index in range(len(previous_questions))
+        ]
+        if category_id is None or None in previous_questions:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        count = get_int(request_data, 'count')
+        if 'count' not in request_data:
+            count = 1
+
+        if count is None or not 0 < count <= MAX_QUIZ_QUESTIONS:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        # Questions are sampled uniformly, as asked counts are kept by the
+        # WSGI app's sampler.
+        if request_data.get('strategy', QUIZ_STRATEGY_UNIFORM) \
+                not in QUIZ_STRATEGIES:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        random_questions = await get_random_questions(
+            category_id=category_id,
+            previous_questions=previous_questions,
+            count=count,
+            difficulty=get_quiz_difficulty(request_data)
+        )
+
+        if 'count' in request_data:
+            return json_response({
+                'questions': random_questions,
+                'success': True
+            })
+
+        return json_response({
+            'question': random_questions[0] if random_questions else None,
+            'success': True
+        })
+
+    async def start_quiz_session(request):
+        """
+        Start quiz session asking questions of given category.
+
+        :param request:
+        :return:
+        """
+        request_data = await get_json(request)
+        quiz_category = request_data.get('quiz_category')
+
+        if not quiz_category:
+            raise HTTPException(STATUS_BAD_REQUEST)
+
+        rows = await database.fetch_all(
+            get_question_ids_query(quiz_category.get('id', 0)).statement
+        )
+        session = QuizSession.start([row['id'] for row in rows])
+        quiz_sessions.save(session)
+
+        return json_response({
+            'success': True,
+            'session_id': session.id,
+            'total_questions': session.remaining
+        }, STATUS_CREATED)
+
+    async def next_quiz_question(request):
+        """
+        Return next question of quiz session.
+
+        :param request:
+        :return:
+        """
+        session = quiz_sessions.get(request.path_params['session_id'])
+        if session is None:
+            raise HTTPException(STATUS_NOT_FOUND)
+
+        question = None
+        while question is None and session.remaining:
+            question = await fetch_question(session.next_question_id())
+
+        quiz_sessions.save(session)
+        return json_response({
+            'success': True,
+            'question': question,
+            'remaining_questions': session.remaining
+        })
+
+    async def end_quiz_session(request):
+        """
+        End quiz session.
+
+        :param request:
+        :return:
+        """
+        session_id = request.path_params['session_id']
+        if quiz_sessions.get(session_id) is None:
+            raise HTTPException(STATUS_NOT_FOUND)
+
+        quiz_sessions.delete(session_id)
+        return Response(status_code=STATUS_NO_CONTENT)
+
+    async def http_error(request, error):
+        """
+        Error handler returning the JSON body of the flask error handlers.
+
+        :param request:
+        :param error:
+        :return:
+        """
+        return json_response({
+            'success': False,
+            'error': error.status_code,
+            'message': ERROR_MESSAGES.get(error.status_code, error.detail)
+        }, error.status_code)
+
+    async def internal_server_error(request, error):
+        """
+        Error handler for internal server error with status code 500.
+
+        :param request:
+        :param error:
+        :return:
+        """
+        return json_response({
+            'success': False,
+            'error': STATUS_INTERNAL_SERVER_ERROR,
+            'message': ERROR_MESSAGES[STATUS_INTERNAL_SERVER_ERROR]
+        }, STATUS_INTERNAL_SERVER_ERROR)
+
+    return Starlette(
+        routes=[
+            Route('/categories', get_categories),
+            Route('/questions', get_questions),
+            Route('/questions', add_question, methods=['POST']),
+            Route('/questions/{question_id:int}', delete_question,
+                  methods=['DELETE']),
+            Route('/questions/filter', search_questions, methods=['POST']),
+            Route('/categories/{category_id:int}/questions',
+                  get_questions_by_category),
+            Route('/quizzes', play_quiz, methods=['POST']),
+            Route('/quizzes/sessions', start_quiz_session, methods=['POST']),
+            Route('/quizzes/{session_id}/next', next_quiz_question,
+                  methods=['POST']),
+            Route('/quizzes/{session_id}', end_quiz_session,
+                  methods=['DELETE']),
+        ],
+        middleware=[
+            Middleware(
+                CORSMiddleware, allow_origins=['*'],
+                allow_headers=['Content-Type', 'Authorization'],
+                allow_methods=['GET', 'POST', 'PUT', 'PATCH', 'DELETE',
+                               'OPTIONS']
+            ),
+            Middleware(
+                GZipMiddleware,
+                minimum_size=flask_app.config.get(
+                    'COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE
+                ),
+                compresslevel=flask_app.config.get(
+                    'COMPRESS_GZIP_LEVEL', COMPRESS_GZIP_LEVEL
+                )
+            ),
+            Middleware(AppContextMiddleware, flask_app=flask_app),
+        ],
+        exception_handlers={
+            HTTPException: http_error,
+            Exception: internal_server_error,
+        },
+        on_startup=[database.connect],
+        on_shutdown=[database.disconnect],
+    )
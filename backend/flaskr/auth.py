@@ -0,0 +1,48 @@
+"""Admin authorization module for flaskr app."""
+
+import functools
+import hmac
+import os
+
+from flask import abort, current_app, request
+
+from flaskr.constants import STATUS_FORBIDDEN, STATUS_UNAUTHORIZED
+
+
+def get_admin_token():
+    """
+    Return admin token from app config or environment.
+
+    :return: token or None if admin routes are disabled.
+    """
+    return current_app.config.get(
+        'ADMIN_TOKEN', os.environ.get('ADMIN_TOKEN')
+    )
+
+
+def admin_required(view):
+    """
+    Serve a route only to requests with the admin token.
+
+    The token is sent as an Authorization: Bearer header. Without a token
+    configured the route is forbidden to everyone.
+
+    :param view:
+    :return:
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = get_admin_token()
+        if not token:
+            abort(STATUS_FORBIDDEN)
+
+        scheme, _, credentials = request.headers.get(
+            'Authorization', ''
+        ).partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(
+                credentials.encode(), token.encode()):
+            abort(STATUS_UNAUTHORIZED)
+
+        return view(*args, **kwargs)
+
+    return wrapper
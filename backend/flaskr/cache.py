@@ -0,0 +1,549 @@
+"""Cache module for flaskr app."""
+
+import functools
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from flask import current_app, has_app_context, request
+
+from flaskr.compression import (
+    compress_data, encoded_response, negotiate_encoding
+)
+from flaskr.conditional import get_current_version, get_current_versions
+from flaskr.constants import (
+    CATEGORY_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL,
+    STATUS_OK
+)
+from flaskr.replicas import has_recent_write
+
+from models import Category
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class CategoryCache:
+    """Process local cache of the categories table of an app."""
+
+    def __init__(self, ttl=CATEGORY_CACHE_TTL):
+        """
+        Init method.
+
+        :param ttl: seconds after which categories are reloaded.
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._expires_at = 0
+        self.version = None
+        self._categories = {}
+        self._categories_by_id = {}
+        self._response_data = b''
+        self._encoded_response_data = {}
+
+    def _load(self):
+        """
+        Load categories from database if cache is empty, expired or older.
+
+        In a request the categories are reloaded as soon as the version of
+        the categories table changes, e.g. after a write of another process.
+
+        :return:
+        """
+        version = get_current_version(Category.__tablename__)
+        with self._lock:
+            if not self.expired and version in (None, self.version):
+                return
+
+            self.version = version
+
+            categories = Category.query.with_entities(
+                Category.id, Category.type
+            ).order_by(Category.id)
+            self._store([
+                {'id': category_id, 'type': category_type}
+                for category_id, category_type in categories
+            ])
+
+    def _store(self, categories):
+        """
+        Store given formatted categories until the TTL expires.
+
+        :param categories: formatted categories ordered by id.
+        :return:
+        """
+        self._categories = {
+            category['id']: category['type'] for category in categories
+        }
+        self._categories_by_id = {
+            category['id']: category for category in categories
+        }
+        self._response_data = current_app.json.response({
+            'success': True,
+            'categories': self._categories
+        }).get_data()
+        self._encoded_response_data = {}
+        self._expires_at = time.monotonic() + self.ttl
+
+    @property
+    def expired(self):
+        """
+        Return whether categories have to be reloaded.
+
+        :return:
+        """
+        return time.monotonic() >= self._expires_at
+
+    def update(self, categories):
+        """
+        Store categories loaded outside of the cache, e.g. by the ASGI app.
+
+        :param categories: formatted categories ordered by id.
+        :return:
+        """
+        with self._lock:
+            self.version = None
+            self._store(categories)
+
+    def get_all(self):
+        """
+        Return categories as dict of id and type.
+
+        :return:
+        """
+        self._load()
+        return dict(self._categories)
+
+    def get(self, category_id):
+        """
+        Return formatted category by given category id.
+
+        :param category_id:
+        :return:
+        """
+        self._load()
+        category = self._categories_by_id.get(category_id)
+        return dict(category) if category else None
+
+    def get_response_data(self):
+        """
+        Return serialized JSON body of the categories response.
+
+        :return:
+        """
+        self._load()
+        return self._response_data
+
+    def get_encoded_response_data(self, encoding):
+        """
+        Return body of the categories response compressed with given encoding.
+
+        The body is compressed once per encoding and load of the categories.
+
+        :param encoding: gzip, br or None.
+        :return: data, encoding used or None
+        """
+        self._load()
+        with self._lock:
+            if encoding not in self._encoded_response_data:
+                self._encoded_response_data[encoding] = compress_data(
+                    self._response_data, encoding
+                )
+
+            return self._encoded_response_data[encoding]
+
+    def invalidate(self):
+        """
+        Drop cached categories so they are reloaded on next access.
+
+        :return:
+        """
+        with self._lock:
+            self._expires_at = 0
+
+
+def get_category_cache():
+    """
+    Return category cache of the current app.
+
+    :return:
+    """
+    return current_app.extensions['category_cache']
+
+
+class CacheBackend(ABC):
+    """Interface of response cache storage."""
+
+    evictions = 0
+
+    @abstractmethod
+    def get(self, key):
+        """
+        Return value stored under given key.
+
+        :param key:
+        :return: value or None if it does not exist or expired.
+        """
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """
+        Store value under given key.
+
+        :param key:
+        :param value: bytes to store.
+        :param ttl: seconds after which the value expires.
+        :return:
+        """
+
+    @abstractmethod
+    def incr(self, key):
+        """
+        Increment counter stored under given key and return new value.
+
+        :param key:
+        :return:
+        """
+
+
+class LRUCacheBackend(CacheBackend):
+    """Process local cache storage with LRU and TTL eviction."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        """
+        Init method.
+
+        :param max_entries: least recently used entries above it are evicted.
+        """
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counters = {}
+
+    def get(self, key):
+        """
+        Return value stored under given key.
+
+        :param key:
+        :return: value or None if it does not exist or expired.
+        """
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Store value under given key.
+
+        :param key:
+        :param value:
+        :param ttl: seconds after which the value expires, never if None.
+        :return:
+        """
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def incr(self, key):
+        """
+        Increment counter stored under given key and return new value.
+
+        Counters are kept apart from entries and never evicted.
+
+        :param key:
+        :return:
+        """
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisCacheBackend(CacheBackend):
+    """Cache storage shared by processes through a Redis compatible client."""
+
+    def __init__(self, client, prefix='trivia:'):
+        """
+        Init method.
+
+        :param client: client with Redis get, set and incr commands.
+        :param prefix: prefix of all keys.
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        """
+        Return value stored under given key.
+
+        :param key:
+        :return: value or None if it does not exist or expired.
+        """
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        """
+        Store value under given key.
+
+        :param key:
+        :param value:
+        :param ttl: seconds after which the value expires, never if None.
+        :return:
+        """
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def incr(self, key):
+        """
+        Increment counter stored under given key and return new value.
+
+        :param key:
+        :return:
+        """
+        return self.client.incr(self.prefix + key)
+
+
+class ResponseCache:
+    """
+    Cache of route responses keyed by route and request arguments.
+
+    Every cached route belongs to namespaces, e.g. the questions of a
+    category. Writes invalidate a namespace by incrementing its generation,
+    which is part of the keys of its responses, so stale responses are
+    never read again and age out of the backend. Keys also hold the table
+    versions of the request, so writes of other processes, which do not
+    share a process local cache, change them as well.
+    """
+
+    def __init__(self, backend=None, ttls=None):
+        """
+        Init method.
+
+        :param backend: cache storage, process local LRU if None.
+        :param ttls: seconds responses of a route are cached, by route.
+        """
+        self.backend = backend or LRUCacheBackend()
+        self.ttls = ttls or {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        """
+        Count cache hit or miss.
+
+        :param hit:
+        :return:
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_generation(self, namespace):
+        """
+        Return current generation of given namespace.
+
+        :param namespace:
+        :return:
+        """
+        generation = self.backend.get(f'generation:{namespace}')
+        return int(generation) if generation else 0
+
+    def invalidate(self, *namespaces):
+        """
+        Invalidate responses of given namespaces.
+
+        :param namespaces:
+        :return:
+        """
+        for namespace in namespaces:
+            self.backend.incr(f'generation:{namespace}')
+
+    def invalidate_questions(self, category_ids):
+        """
+        Invalidate responses listing questions of given categories.
+
+        :param category_ids:
+        :return:
+        """
+        self.invalidate('questions', 'search', *(
+            f'category:{category_id}' for category_id in set(category_ids)
+        ))
+
+    def get_key(self, route, namespaces, encoding=None):
+        """
+        Return cache key of current request to given route.
+
+        :param route:
+        :param namespaces:
+        :param encoding: content encoding of the response.
+        :return:
+        """
+        generations = ':'.join([
+            *(str(self.get_generation(namespace)) for namespace in namespaces),
+            *(str(version) for version, _ in get_current_versions().values())
+        ])
+        arguments = hashlib.sha1(b'\n'.join([
+            request.full_path.encode(),
+            request.headers.get('Accept', '').encode(),
+            (encoding or '').encode(),
+            request.get_data(),
+        ])).hexdigest()
+        return f'response:{route}:{generations}:{arguments}'
+
+    def get_stats(self):
+        """
+        Return hit, miss and eviction counters.
+
+        :return:
+        """
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+        }
+
+
+def create_response_cache(config):
+    """
+    Return response cache configured by given app config.
+
+    RESPONSE_CACHE_REDIS_URL selects a Redis backend shared by all
+    processes, which needs the redis package. RESPONSE_CACHE_TTLS maps route
+    names to seconds their responses are cached.
+
+    :param config: app config.
+    :return:
+    """
+    backend = None
+    redis_url = config.get('RESPONSE_CACHE_REDIS_URL')
+    if redis_url:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                'RESPONSE_CACHE_REDIS_URL requires the redis package'
+            )
+
+        backend = RedisCacheBackend(redis.Redis.from_url(redis_url))
+
+    return ResponseCache(backend, ttls=config.get('RESPONSE_CACHE_TTLS'))
+
+
+def cached(route, *namespaces):
+    """
+    Cache JSON responses of a route in the response cache of the app.
+
+    Responses are stored compressed with the encoding negotiated with the
+    client, so cache hits are not compressed again. Values are the encoding,
+    a newline and the body. Clients reading from the primary after a write
+    bypass the cache, which may hold responses read from a lagging replica.
+
+    :param route: name of the route, used for keys and TTL settings.
+    :param namespaces: namespaces of the route, formatted with view args.
+    :return:
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if current_app.extensions.get('db_replicas') \
+                    and has_recent_write():
+                return view(*args, **kwargs)
+
+            response_cache = current_app.extensions['response_cache']
+            encoding = negotiate_encoding()
+            key = response_cache.get_key(
+                route,
+                [namespace.format(**kwargs) for namespace in namespaces],
+                encoding
+            )
+
+            value = response_cache.backend.get(key)
+            response_cache.record(hit=value is not None)
+            if value is not None:
+                stored_encoding, _, data = value.partition(b'\n')
+                return encoded_response(data, stored_encoding.decode())
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == STATUS_OK \
+                    and not response.is_streamed \
+                    and response.mimetype == current_app.json.mimetype:
+                data, encoding = compress_data(response.get_data(), encoding)
+                if encoding:
+                    response.set_data(data)
+                    response.headers['Content-Encoding'] = encoding
+
+                ttl = response_cache.ttls.get(route, RESPONSE_CACHE_TTL)
+                response_cache.backend.set(
+                    key, (encoding or '').encode() + b'\n' + data, ttl
+                )
+
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_category_writes(session, flush_context):
+    """
+    Mark session if categories were written in flush.
+
+    :param session:
+    :param flush_context:
+    :return:
+    """
+    written = (session.new, session.dirty, session.deleted)
+    if any(isinstance(instance, Category)
+           for instances in written for instance in instances):
+        session.info['categories_written'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_category_cache(session):
+    """
+    Invalidate category cache after categories were committed.
+
+    :param session:
+    :return:
+    """
+    if not session.info.pop('categories_written', False) \
+            or not has_app_context():
+        return
+
+    if 'category_cache' in current_app.extensions:
+        get_category_cache().invalidate()
+    if 'response_cache' in current_app.extensions:
+        current_app.extensions['response_cache'].invalidate('categories')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_category_writes(session):
+    """
+    Forget category writes of a rolled back transaction.
+
+    :param session:
+    :return:
+    """
+    session.info.pop('categories_written', None)
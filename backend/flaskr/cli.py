@@ -0,0 +1,128 @@
+"""Command line interface module for flaskr app."""
+
+import json
+import os
+
+import click
+
+from flask import current_app
+from flask.cli import with_appcontext
+
+from flaskr.compression import iter_compress
+from flaskr.constants import (
+    ENCODING_GZIP, EXPORT_FORMATS, EXPORT_FORMAT_NDJSON, IMPORT_BATCH_SIZE,
+    STREAM_BATCH_SIZE
+)
+from flaskr.exporter import get_export_query, iter_export
+from flaskr.importer import (
+    import_questions, parse_csv, parse_json, parse_ndjson
+)
+
+from models import upgrade_db
+
+IMPORT_FORMATS = ('json', 'ndjson', 'csv')
+
+
+def invalidate_questions(mappings):
+    """
+    Invalidate cached responses listing given imported questions.
+
+    :param mappings: question mappings.
+    :return:
+    """
+    current_app.extensions['response_cache'].invalidate_questions(
+        mapping['category'] for mapping in mappings
+    )
+
+
+@click.command('import-questions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(IMPORT_FORMATS),
+              help='File format, guessed from the file extension if omitted.')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True,
+              help='Number of questions inserted per transaction.')
+@with_appcontext
+def import_questions_command(path, file_format, batch_size):
+    """
+    Import questions from a JSON, NDJSON or CSV file.
+
+    :param path:
+    :param file_format:
+    :param batch_size:
+    :return:
+    """
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.')
+    if file_format not in IMPORT_FORMATS:
+        raise click.UsageError('Unable to guess file format, use --format.')
+
+    with open(path, encoding='utf-8', newline='') as file:
+        if file_format == 'json':
+            rows = parse_json(json.load(file))
+        elif file_format == 'ndjson':
+            rows = parse_ndjson(file)
+        else:
+            rows = parse_csv(file)
+
+        result = import_questions(
+            rows, batch_size=batch_size, on_commit=invalidate_questions
+        )
+
+    click.echo(f'Inserted {result["inserted"]} questions.')
+    for error in result['errors']:
+        click.echo(f'Row {error["row"]}: {error["message"]}', err=True)
+
+    if result['failed']:
+        click.echo(f'Failed {result["failed"]} rows.', err=True)
+
+
+@click.command('export-questions')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True),
+                default='-')
+@click.option('--format', 'export_format', type=click.Choice(EXPORT_FORMATS),
+              help='File format, guessed from the file extension if omitted.')
+@click.option('--category', 'category_id', type=int,
+              help='Export only questions of this category.')
+@click.option('--gzip', 'use_gzip', is_flag=True,
+              help='Compress the output with gzip.')
+@click.option('--batch-size', default=STREAM_BATCH_SIZE, show_default=True,
+              help='Number of questions read per round trip.')
+@with_appcontext
+def export_questions_command(path, export_format, category_id, use_gzip,
+                             batch_size):
+    """
+    Export questions as NDJSON or CSV to a file or standard output.
+
+    :param path:
+    :param export_format:
+    :param category_id:
+    :param use_gzip:
+    :param batch_size:
+    :return:
+    """
+    if export_format is None:
+        extension = os.path.splitext(path[:-3] if path.endswith('.gz')
+                                     else path)[1].lstrip('.')
+        export_format = extension if extension in EXPORT_FORMATS \
+            else EXPORT_FORMAT_NDJSON
+
+    chunks = iter_export(
+        get_export_query(category_id), export_format, batch_size
+    )
+    if use_gzip or path.endswith('.gz'):
+        chunks = iter_compress(chunks, ENCODING_GZIP)
+
+    with click.open_file(path, 'wb') as file:
+        for chunk in chunks:
+            file.write(chunk)
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """
+    Create missing tables and upgrade schema of the database.
+
+    :return:
+    """
+    upgrade_db()
+    click.echo('Database is up to date.')
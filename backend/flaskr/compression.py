@@ -0,0 +1,158 @@
+"""Compression module for flaskr app."""
+
+import zlib
+
+from flask import current_app, request
+
+from flaskr.constants import (
+    COMPRESSIBLE_MIMETYPES, COMPRESS_BROTLI_LEVEL, COMPRESS_GZIP_LEVEL,
+    COMPRESS_MIN_SIZE, ENCODING_BROTLI, ENCODING_GZIP, STATUS_OK
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def get_encodings():
+    """
+    Return supported content encodings, preferred first.
+
+    Brotli needs the brotli package.
+
+    :return:
+    """
+    if brotli is None:
+        return [ENCODING_GZIP]
+
+    return [ENCODING_BROTLI, ENCODING_GZIP]
+
+
+def negotiate_encoding():
+    """
+    Return best encoding accepted by the client of the current request.
+
+    :return: content encoding or None if the client accepts none.
+    """
+    return request.accept_encodings.best_match(get_encodings())
+
+
+def compress(data, encoding):
+    """
+    Compress given data with given encoding at the configured level.
+
+    gzip output does not contain a timestamp, so equal data always gives
+    equal bytes.
+
+    :param data: bytes.
+    :param encoding: gzip or br.
+    :return:
+    """
+    return b''.join(iter_compress([data], encoding))
+
+
+def iter_compress(chunks, encoding):
+    """
+    Yield compressed chunks of given stream of chunks.
+
+    The compressor keeps a fixed window, so memory use does not depend on
+    the length of the stream.
+
+    :param chunks: iterable of bytes.
+    :param encoding: gzip or br.
+    :return:
+    """
+    config = current_app.config
+    if encoding == ENCODING_BROTLI:
+        compressor = brotli.Compressor(
+            quality=config.get('COMPRESS_BROTLI_LEVEL', COMPRESS_BROTLI_LEVEL)
+        )
+        compress_chunk, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(
+            config.get('COMPRESS_GZIP_LEVEL', COMPRESS_GZIP_LEVEL),
+            zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+        compress_chunk, finish = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        data = compress_chunk(chunk)
+        if data:
+            yield data
+
+    yield finish()
+
+
+def compress_data(data, encoding):
+    """
+    Compress given data if an encoding is given and data is large enough.
+
+    Data smaller than COMPRESS_MIN_SIZE bytes is returned as is, as
+    compression would not save a round trip.
+
+    :param data: bytes.
+    :param encoding: gzip, br or None.
+    :return: data, encoding used or None
+    """
+    min_size = current_app.config.get('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE)
+    if encoding is None or len(data) < min_size:
+        return data, None
+
+    return compress(data, encoding), encoding
+
+
+def encoded_response(data, encoding, mimetype=None):
+    """
+    Return response of given data, compressed with given encoding.
+
+    :param data: bytes.
+    :param encoding: encoding of data or None.
+    :param mimetype: JSON if None.
+    :return:
+    """
+    response = current_app.response_class(
+        data, mimetype=mimetype or current_app.json.mimetype
+    )
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+
+    return response
+
+
+def compress_response(response):
+    """
+    Compress response with the encoding negotiated with the client.
+
+    Streamed responses and responses compressed already, e.g. read from the
+    response cache, are left alone.
+
+    :param response:
+    :return:
+    """
+    if response.status_code != STATUS_OK \
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if response.is_streamed or response.direct_passthrough \
+            or 'Content-Encoding' in response.headers:
+        return response
+
+    data, encoding = compress_data(response.get_data(), negotiate_encoding())
+    if encoding:
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+
+    return response
+
+
+def init_app(app):
+    """
+    Compress responses of given app.
+
+    :param app:
+    :return:
+    """
+    app.after_request(compress_response)
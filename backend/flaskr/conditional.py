@@ -0,0 +1,118 @@
+"""Conditional requests module for flaskr app."""
+
+import functools
+import zlib
+
+from flask import current_app, g, has_request_context, request
+
+from flaskr.compression import negotiate_encoding
+from flaskr.constants import CACHE_MAX_AGE, STATUS_NOT_MODIFIED, STATUS_OK
+
+from models import get_table_versions, versioned_tables
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from werkzeug.http import is_resource_modified
+
+
+def get_current_versions():
+    """
+    Return versions of the versioned tables read once per request.
+
+    The ETag, the response cache key and the in-memory caches of a request
+    all use the same versions, so a body never has the ETag of other data.
+
+    :return: dict of version and last_modified datetime by table.
+    """
+    if 'table_versions' not in g:
+        g.table_versions = get_table_versions(*versioned_tables)
+
+    return g.table_versions
+
+
+def get_current_version(table):
+    """
+    Return version of given table read once per request.
+
+    :param table: table name.
+    :return: version or None outside of a request.
+    """
+    if not has_request_context():
+        return None
+
+    return get_current_versions()[table][0]
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_current_versions(session):
+    """
+    Read versions again after a commit of the request.
+
+    :param session:
+    :return:
+    """
+    if has_request_context():
+        g.pop('table_versions', None)
+
+
+def get_etag(tables):
+    """
+    Return ETag and last modification time of given tables.
+
+    The ETag is built from table versions instead of the response body, so
+    it is known before the route runs. It varies with the Accept header and
+    the negotiated content encoding, as the response body does.
+
+    :param tables: table names.
+    :return: etag, last_modified
+    """
+    versions = get_current_versions()
+    last_modified = max(versions[table][1] for table in tables)
+    accept = zlib.crc32('\n'.join([
+        request.headers.get('Accept', ''), negotiate_encoding() or ''
+    ]).encode())
+    etag = '-'.join([
+        *(str(versions[table][0]) for table in tables),
+        format(int(last_modified.timestamp()), 'x'), format(accept, 'x')
+    ])
+    return etag, last_modified
+
+
+def conditional(*tables):
+    """
+    Answer conditional GET requests of a route from table versions.
+
+    Requests with a matching If-None-Match or If-Modified-Since header get
+    304 Not Modified without calling the route.
+
+    :param tables: names of tables the route reads.
+    :return:
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = get_etag(tables)
+            if not is_resource_modified(
+                request.environ, etag=etag, last_modified=last_modified
+            ):
+                response = current_app.response_class()
+                response.status_code = STATUS_NOT_MODIFIED
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+
+            if response.status_code in (STATUS_OK, STATUS_NOT_MODIFIED):
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                response.cache_control.public = True
+                response.cache_control.max_age = current_app.config.get(
+                    'CACHE_MAX_AGE', CACHE_MAX_AGE
+                )
+                response.vary.add('Accept')
+                response.vary.add('Accept-Encoding')
+
+            return response
+
+        return wrapper
+
+    return decorator
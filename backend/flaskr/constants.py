@@ -3,6 +3,7 @@
 STATUS_OK = 200
 STATUS_CREATED = 201
 STATUS_NO_CONTENT = 204
+STATUS_NOT_MODIFIED = 304
 STATUS_BAD_REQUEST = 400
 STATUS_UNAUTHORIZED = 401
 STATUS_FORBIDDEN = 403
@@ -15,6 +16,7 @@ ERROR_MESSAGES = {
     STATUS_OK: 'Ok',
     STATUS_CREATED: 'Created',
     STATUS_NO_CONTENT: 'No Content',
+    STATUS_NOT_MODIFIED: 'Not Modified',
     STATUS_BAD_REQUEST: 'Bad Request',
     STATUS_UNAUTHORIZED: 'Unauthorized',
     STATUS_FORBIDDEN: 'Forbidden',
@@ -25,3 +27,59 @@ ERROR_MESSAGES = {
 }
 
 QUESTIONS_PER_PAGE = 10
+MAX_QUESTIONS_PER_PAGE = 100
+
+JSON_PROVIDER_DEFAULT = 'default'
+JSON_PROVIDER_ORJSON = 'orjson'
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+CSV_MIMETYPE = 'text/csv'
+STREAM_BATCH_SIZE = 1000
+
+EXPORT_FORMAT_NDJSON = 'ndjson'
+EXPORT_FORMAT_CSV = 'csv'
+EXPORT_FORMATS = (EXPORT_FORMAT_NDJSON, EXPORT_FORMAT_CSV)
+
+ENCODING_GZIP = 'gzip'
+ENCODING_BROTLI = 'br'
+COMPRESS_MIN_SIZE = 500
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_LEVEL = 4
+COMPRESSIBLE_MIMETYPES = (
+    'application/json', 'text/plain', NDJSON_MIMETYPE, CSV_MIMETYPE
+)
+
+SEARCH_MODE_SUBSTRING = 'substring'
+SEARCH_MODE_FULLTEXT = 'fulltext'
+SEARCH_MODES = (SEARCH_MODE_SUBSTRING, SEARCH_MODE_FULLTEXT)
+
+CATEGORY_CACHE_TTL = 300
+
+QUESTION_INDEX_TTL = 300
+QUESTION_INDEX_MAX_PROBES = 8
+
+QUIZ_STRATEGY_UNIFORM = 'uniform'
+QUIZ_STRATEGY_LEAST_ASKED = 'least_asked'
+QUIZ_STRATEGIES = (QUIZ_STRATEGY_UNIFORM, QUIZ_STRATEGY_LEAST_ASKED)
+MAX_SAMPLING_TREES = 64
+
+MAX_QUIZ_QUESTIONS = 50
+QUIZ_SESSION_TTL = 60 * 60
+QUIZ_PERMUTATION_ROUNDS = 4
+MAX_QUIZ_SESSIONS = 10000
+
+IMPORT_BATCH_SIZE = 1000
+MAX_BULK_QUESTIONS = 10000
+BULK_UPDATE_FIELDS = ('category', 'difficulty')
+MAX_IMPORT_ERRORS = 1000
+
+CACHE_MAX_AGE = 10
+
+READ_YOUR_WRITES_SECONDS = 5
+READ_YOUR_WRITES_COOKIE = 'trivia_last_write'
+
+RESPONSE_CACHE_TTL = 60
+RESPONSE_CACHE_MAX_ENTRIES = 10000
+
+SLOW_REQUEST_THRESHOLD_MS = 500
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4'
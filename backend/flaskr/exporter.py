@@ -0,0 +1,124 @@
+"""Question export module for flaskr app."""
+
+import csv
+import io
+
+from flask import current_app
+
+from flaskr.constants import (
+    CSV_MIMETYPE, EXPORT_FORMAT_CSV, NDJSON_MIMETYPE, STREAM_BATCH_SIZE
+)
+from flaskr.importer import QUESTION_FIELDS
+
+from models import Question, QuestionRecord, db, question_columns
+
+EXPORT_FIELDS = ('id',) + QUESTION_FIELDS
+
+EXPORT_MIMETYPES = {
+    EXPORT_FORMAT_CSV: CSV_MIMETYPE,
+}
+
+
+def get_export_query(category_id=None):
+    """
+    Return query of questions of given category or all questions by id.
+
+    :param category_id:
+    :return:
+    """
+    questions = Question.query.order_by(Question.id)
+    if category_id:
+        questions = questions.filter(Question.category == category_id)
+
+    return questions
+
+
+def iter_batches(questions, batch_size=STREAM_BATCH_SIZE):
+    """
+    Yield lists of column rows of given questions query.
+
+    Rows are fetched from a server side cursor in batches, so memory use does
+    not depend on the number of questions. The statement is run without
+    the ORM, which would build a keyed tuple per row.
+
+    :param questions: questions query.
+    :param batch_size:
+    :return:
+    """
+    statement = questions.with_entities(*question_columns).statement
+    result = db.session.execute(
+        statement.execution_options(stream_results=True),
+        mapper=Question.__mapper__
+    )
+    try:
+        while True:
+            batch = result.fetchmany(batch_size)
+            if not batch:
+                return
+
+            yield batch
+    finally:
+        result.close()
+
+
+def iter_ndjson(questions, batch_size=STREAM_BATCH_SIZE):
+    """
+    Yield chunks of a JSON question per line of given questions query.
+
+    :param questions: questions query.
+    :param batch_size: questions per chunk.
+    :return:
+    """
+    dumps = current_app.json.dumps
+    for batch in iter_batches(questions, batch_size):
+        yield ''.join(
+            dumps(QuestionRecord(*row)) + '\n' for row in batch
+        ).encode()
+
+
+def iter_csv(questions, batch_size=STREAM_BATCH_SIZE):
+    """
+    Yield chunks of CSV with a header line of given questions query.
+
+    The columns are the ones read by the CSV import, plus the id.
+
+    :param questions: questions query.
+    :param batch_size: questions per chunk.
+    :return:
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in iter_batches(questions, batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def iter_export(questions, export_format, batch_size=STREAM_BATCH_SIZE):
+    """
+    Yield chunks of given questions query in given format.
+
+    :param questions: questions query.
+    :param export_format: ndjson or csv.
+    :param batch_size: questions per chunk.
+    :return:
+    """
+    if export_format == EXPORT_FORMAT_CSV:
+        return iter_csv(questions, batch_size)
+
+    return iter_ndjson(questions, batch_size)
+
+
+def get_export_mimetype(export_format):
+    """
+    Return mimetype of given export format.
+
+    :param export_format:
+    :return:
+    """
+    return EXPORT_MIMETYPES.get(export_format, NDJSON_MIMETYPE)
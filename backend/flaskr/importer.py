@@ -0,0 +1,190 @@
+"""Bulk question import module for flaskr app."""
+
+import csv
+import json
+
+from flaskr.constants import IMPORT_BATCH_SIZE, MAX_IMPORT_ERRORS
+from flaskr.question_index import invalidate_question_index
+
+from models import Category, Question, db
+
+from sqlalchemy.exc import SQLAlchemyError
+
+QUESTION_FIELDS = ('question', 'answer', 'category', 'difficulty')
+
+
+def parse_json(data):
+    """
+    Return rows of a JSON array of questions.
+
+    :param data: decoded JSON document.
+    :return:
+    """
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of questions')
+
+    return data
+
+
+def parse_ndjson(lines):
+    """
+    Yield rows of newline delimited JSON questions.
+
+    Lines which are not valid JSON are yielded as the error raised for them.
+
+    :param lines: iterable of text lines.
+    :return:
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+
+        try:
+            yield json.loads(line)
+        except ValueError as exp:
+            yield exp
+
+
+def parse_csv(lines):
+    """
+    Yield rows of CSV questions with a header line.
+
+    :param lines: iterable of text lines.
+    :return:
+    """
+    return csv.DictReader(lines)
+
+
+def stop_at_decode_error(rows):
+    """
+    Yield given rows, then the error of a body which is not valid UTF-8.
+
+    Bodies are decoded while they are read, so earlier rows may be committed
+    already when the error is raised. It is reported as the error of the
+    next row and ends the rows, as the rest of the body cannot be decoded.
+
+    :param rows: iterable of rows parsed from decoded lines.
+    :return:
+    """
+    try:
+        yield from rows
+    except UnicodeDecodeError as exp:
+        yield ValueError(
+            f'Invalid UTF-8, rows from here on are skipped: {exp.reason}'
+        )
+
+
+def validate_question(row, category_ids):
+    """
+    Return question mapping for given row or raise ValueError.
+
+    :param row:
+    :param category_ids: ids of existing categories.
+    :return:
+    """
+    if isinstance(row, Exception):
+        raise ValueError(str(row))
+
+    if not isinstance(row, dict):
+        raise ValueError('Expected an object')
+
+    missing = [field for field in QUESTION_FIELDS
+               if row.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f'Missing fields: {", ".join(missing)}')
+
+    try:
+        category = int(row['category'])
+        difficulty = int(row['difficulty'])
+    except (TypeError, ValueError):
+        raise ValueError('Category and difficulty must be integers')
+
+    if category not in category_ids:
+        raise ValueError(f'Unknown category: {category}')
+
+    return {
+        'question': str(row['question']),
+        'answer': str(row['answer']),
+        'category': category,
+        'difficulty': difficulty,
+    }
+
+
+def insert_questions(mappings):
+    """
+    Insert given question mappings in a single transaction.
+
+    Bulk inserts do not return ids, so the question index is rebuilt. They
+    fire no flush events either, so the session is marked as written here
+    for read your writes consistency.
+
+    :param mappings:
+    :return:
+    """
+    db.session.bulk_insert_mappings(Question, mappings)
+    db.session.commit()
+    db.session.info['wrote'] = True
+    invalidate_question_index()
+
+
+def import_questions(rows, batch_size=IMPORT_BATCH_SIZE, on_commit=None):
+    """
+    Validate and insert questions in batches.
+
+    Invalid rows are reported and skipped without aborting the import, as
+    is the rest of a body which is not valid UTF-8. A batch failing in the
+    database is rolled back and inserted again in halves, so only the rows
+    rejected by the database are reported.
+
+    :param rows: iterable of question rows.
+    :param batch_size: number of questions inserted per transaction.
+    :param on_commit: called with question mappings of committed batches.
+    :return: number of inserted and failed rows and the first errors.
+    """
+    category_ids = {
+        category_id for category_id, in Category.query.with_entities(
+            Category.id
+        )
+    }
+    result = {'inserted': 0, 'failed': 0, 'errors': []}
+
+    def add_error(row_number, message):
+        result['failed'] += 1
+        if len(result['errors']) < MAX_IMPORT_ERRORS:
+            result['errors'].append({'row': row_number, 'message': message})
+
+    def flush(batch):
+        mappings = [mapping for _, mapping in batch]
+        try:
+            insert_questions(mappings)
+        except SQLAlchemyError as exp:
+            db.session.rollback()
+            if len(batch) == 1:
+                add_error(batch[0][0], str(getattr(exp, 'orig', exp)))
+                return
+
+            middle = len(batch) // 2
+            flush(batch[:middle])
+            flush(batch[middle:])
+            return
+
+        result['inserted'] += len(batch)
+        if on_commit:
+            on_commit(mappings)
+
+    batch = []
+    for row_number, row in enumerate(stop_at_decode_error(rows), start=1):
+        try:
+            batch.append((row_number, validate_question(row, category_ids)))
+        except ValueError as exp:
+            add_error(row_number, str(exp))
+            continue
+
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+
+    if batch:
+        flush(batch)
+
+    return result
@@ -0,0 +1,143 @@
+"""JSON provider module for flaskr app."""
+
+from flask.json.provider import DefaultJSONProvider
+
+from flaskr.constants import JSON_PROVIDER_DEFAULT, JSON_PROVIDER_ORJSON
+
+from models import QuestionRecord
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(obj):
+    """
+    Convert object the JSON encoder does not handle.
+
+    Question records are converted directly, which is much faster than the
+    generic dataclasses.asdict of the default provider.
+
+    :param obj:
+    :return:
+    """
+    if isinstance(obj, QuestionRecord):
+        return obj.format()
+
+    return DefaultJSONProvider.default(obj)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """JSON provider of the standard library encoder."""
+
+    default = staticmethod(default)
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider serializing with orjson.
+
+    Question records are dataclasses, which orjson writes as JSON objects
+    directly from their slots. Dates and other types orjson does not handle
+    the same way as flask are passed to the converter of the provider.
+    """
+
+    def get_options(self, *options):
+        """
+        Return orjson options of the provider combined with given options.
+
+        :param options: extra orjson options.
+        :return:
+        """
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+
+        for extra in options:
+            option |= extra
+
+        return option
+
+    def dumps(self, obj, **kwargs):
+        """
+        Serialize given object to a JSON string.
+
+        Arguments of json.dumps are only supported by the standard library
+        encoder.
+
+        :param obj:
+        :param kwargs: arguments of json.dumps.
+        :return:
+        """
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+
+        return orjson.dumps(
+            obj, default=self.default, option=self.get_options()
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        """
+        Deserialize given JSON string or bytes.
+
+        :param s:
+        :param kwargs: arguments of json.loads.
+        :return:
+        """
+        if kwargs:
+            return super().loads(s, **kwargs)
+
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """
+        Return JSON response of given arguments, serialized to bytes once.
+
+        As with jsonify, a single argument is serialized as is, several
+        arguments as an array and keyword arguments as an object.
+
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        if args and kwargs:
+            raise TypeError('response takes either args or kwargs, not both')
+
+        if len(args) == 1:
+            obj = args[0]
+        else:
+            obj = args or kwargs or None
+
+        options = [orjson.OPT_APPEND_NEWLINE]
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            options.append(orjson.OPT_INDENT_2)
+
+        return self._app.response_class(
+            orjson.dumps(
+                obj, default=self.default, option=self.get_options(*options)
+            ),
+            mimetype=self.mimetype
+        )
+
+
+def create_json_provider(app):
+    """
+    Return JSON provider configured by JSON_PROVIDER of given app.
+
+    orjson is used when it is installed, unless JSON_PROVIDER is 'default'.
+
+    :param app:
+    :return:
+    """
+    provider = app.config.get('JSON_PROVIDER')
+    if provider == JSON_PROVIDER_DEFAULT:
+        return JSONProvider(app)
+
+    if orjson is None:
+        if provider == JSON_PROVIDER_ORJSON:
+            raise RuntimeError('JSON_PROVIDER orjson requires orjson package')
+
+        return JSONProvider(app)
+
+    return OrjsonProvider(app)
@@ -0,0 +1,291 @@
+"""Request instrumentation module for flaskr app."""
+
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app, g, has_request_context, request
+
+from flaskr.constants import SLOW_REQUEST_THRESHOLD_MS
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus format."""
+
+    def __init__(self, buckets):
+        """
+        Init method.
+
+        :param buckets: upper bounds of buckets in ascending order.
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        """
+        Record given value.
+
+        :param value:
+        :return:
+        """
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+        self.count += 1
+        self.sum += value
+
+    def render(self, name, labels):
+        """
+        Return lines of the histogram in the Prometheus text format.
+
+        :param name: metric name.
+        :param labels: formatted labels of the series.
+        :return:
+        """
+        lines = [
+            f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class RequestMetrics:
+    """Per route request latency, SQL and payload size metrics."""
+
+    histograms = (
+        ('trivia_request_duration_seconds',
+         'Request duration in seconds.', LATENCY_BUCKETS),
+        ('trivia_request_sql_statements',
+         'SQL statements issued per request.', QUERY_COUNT_BUCKETS),
+        ('trivia_request_db_duration_seconds',
+         'Time spent in SQL statements per request.', LATENCY_BUCKETS),
+        ('trivia_response_size_bytes',
+         'Response payload size in bytes.', SIZE_BUCKETS),
+    )
+
+    def __init__(self):
+        """Init method."""
+        self._lock = threading.Lock()
+        self._series = {}
+        self._requests = defaultdict(int)
+
+    def observe(self, route, method, status, values):
+        """
+        Record metrics of a request.
+
+        :param route: rule of the route.
+        :param method:
+        :param status: response status code.
+        :param values: values by histogram name, None values are skipped.
+        :return:
+        """
+        with self._lock:
+            self._requests[(route, method, status)] += 1
+            for name, _, buckets in self.histograms:
+                if values.get(name) is None:
+                    continue
+
+                key = (name, route, method)
+                if key not in self._series:
+                    self._series[key] = Histogram(buckets)
+                self._series[key].observe(values[name])
+
+    def render(self):
+        """
+        Return lines of all metrics in the Prometheus text format.
+
+        :return:
+        """
+        with self._lock:
+            lines = [
+                '# HELP trivia_requests_total Requests handled.',
+                '# TYPE trivia_requests_total counter',
+            ]
+            for (route, method, status), count in sorted(
+                self._requests.items()
+            ):
+                labels = format_labels(
+                    route=route, method=method, status=status
+                )
+                lines.append(f'trivia_requests_total{{{labels}}} {count}')
+
+            for name, description, _ in self.histograms:
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (series_name, route, method), histogram in sorted(
+                    self._series.items(), key=lambda item: item[0]
+                ):
+                    if series_name == name:
+                        labels = format_labels(route=route, method=method)
+                        lines.extend(histogram.render(name, labels))
+
+        return lines
+
+
+def format_labels(**labels):
+    """
+    Return labels formatted for the Prometheus text format.
+
+    :param labels:
+    :return:
+    """
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in labels.items()
+    )
+
+
+def format_gauges(prefix, stats):
+    """
+    Return lines of numeric stats as Prometheus gauges.
+
+    :param prefix: prefix of metric names.
+    :param stats: dict of stats, values which are not numbers are skipped.
+    :return:
+    """
+    lines = []
+    for name, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f'# TYPE {prefix}_{name} gauge')
+            lines.append(f'{prefix}_{name} {value}')
+
+    return lines
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement_timer(conn, cursor, statement, parameters, context,
+                           executemany):
+    """
+    Remember start time of a SQL statement.
+
+    :param conn:
+    :return:
+    """
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context,
+                      executemany):
+    """
+    Add SQL statement and its duration to current request.
+
+    :param conn:
+    :return:
+    """
+    duration = time.perf_counter() - conn.info['statement_start'].pop()
+    if has_request_context() and 'request_start' in g:
+        g.sql_statements += 1
+        g.db_time += duration
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_statement_timer(exception_context):
+    """
+    Forget start time of a failed SQL statement.
+
+    :param exception_context:
+    :return:
+    """
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('statement_start'):
+        connection.info['statement_start'].pop()
+
+
+def start_request():
+    """
+    Start timing current request.
+
+    :return:
+    """
+    g.request_start = time.perf_counter()
+    g.sql_statements = 0
+    g.db_time = 0.0
+
+
+def finish_request(response):
+    """
+    Add Server-Timing header and record metrics of current request on close.
+
+    The header holds the time until the view returned. Metrics and the slow
+    request log of streamed responses are recorded when the response is
+    closed, after its body was sent, so SQL statements run while streaming
+    are counted. Other responses have their body already and are recorded
+    at once.
+
+    :param response:
+    :return:
+    """
+    if 'request_start' not in g:
+        return response
+
+    duration = time.perf_counter() - g.request_start
+    response.headers['Server-Timing'] = (
+        f'app;dur={duration * 1000:.1f}, '
+        f'db;dur={g.db_time * 1000:.1f};desc="{g.sql_statements} queries"'
+    )
+
+    app = current_app._get_current_object()
+    timings = g._get_current_object()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    method, path = request.method, request.full_path
+    status = response.status_code
+    size = None if response.is_streamed else response.content_length
+
+    def record_request():
+        duration = time.perf_counter() - timings.request_start
+        app.extensions['metrics'].observe(
+            route, method, status, {
+                'trivia_request_duration_seconds': duration,
+                'trivia_request_sql_statements': timings.sql_statements,
+                'trivia_request_db_duration_seconds': timings.db_time,
+                'trivia_response_size_bytes': size,
+            }
+        )
+
+        threshold = app.config.get(
+            'SLOW_REQUEST_THRESHOLD_MS', SLOW_REQUEST_THRESHOLD_MS
+        )
+        if duration * 1000 >= threshold:
+            app.logger.warning(
+                'Slow request %s %s: %.1f ms, %d SQL statements in %.1f ms',
+                method, path, duration * 1000, timings.sql_statements,
+                timings.db_time * 1000
+            )
+
+    if response.is_streamed:
+        response.call_on_close(record_request)
+    else:
+        record_request()
+
+    return response
+
+
+def init_app(app):
+    """
+    Instrument requests of given app.
+
+    :param app:
+    :return:
+    """
+    app.extensions['metrics'] = RequestMetrics()
+    app.before_request(start_request)
+    app.after_request(finish_request)
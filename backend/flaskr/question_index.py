@@ -0,0 +1,603 @@
+"""Question index module for flaskr app."""
+
+import bisect
+import itertools
+import random
+import threading
+import time
+from array import array
+
+from flask import current_app, has_app_context
+
+from flaskr.conditional import get_current_version
+from flaskr.constants import (
+    QUESTION_INDEX_MAX_PROBES, QUESTION_INDEX_TTL, STREAM_BATCH_SIZE
+)
+
+from models import Category, Question, get_table_version
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+def insert_id(ids, question_id):
+    """
+    Insert id into sorted array of ids unless it is there already.
+
+    :param ids: sorted array.
+    :param question_id:
+    :return:
+    """
+    position = bisect.bisect_left(ids, question_id)
+    if position == len(ids) or ids[position] != question_id:
+        ids.insert(position, question_id)
+
+
+def remove_id(ids, question_id):
+    """
+    Remove id from sorted array of ids if it is there.
+
+    :param ids: sorted array.
+    :param question_id:
+    :return:
+    """
+    position = bisect.bisect_left(ids, question_id)
+    if position < len(ids) and ids[position] == question_id:
+        del ids[position]
+
+
+def get_difficulty_keys(category_id, difficulty):
+    """
+    Return keys of difficulty arrays holding a question.
+
+    :param category_id:
+    :param difficulty:
+    :return: list of category id or None for all questions and difficulty.
+    """
+    if difficulty is None:
+        return []
+
+    keys = [(None, difficulty)]
+    if category_id is not None:
+        keys.append((category_id, difficulty))
+
+    return keys
+
+
+class QuestionIndex:
+    """
+    In-memory index of question ids by category and difficulty.
+
+    Ids are kept in sorted arrays of 64 bit integers, one of all questions,
+    one per category and one per difficulty of each category and of all
+    questions, so counts are O(1) and a random question is picked without a
+    query. The index is built on first use and updated after every commit
+    of this process. It keeps the version of the questions table it holds,
+    and is rebuilt in a request reading another version, e.g. after a write
+    of another process, or after the TTL outside of requests.
+    """
+
+    def __init__(self, ttl=QUESTION_INDEX_TTL):
+        """
+        Init method.
+
+        :param ttl: seconds after which the index is rebuilt, never if None.
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._expires_at = 0
+        self._ids = array('q')
+        self._ids_by_category = {}
+        self._ids_by_difficulty = {}
+        self._snapshots = {}
+        self.built_at = None
+        self.version = 0
+        self.db_version = None
+
+    def _build(self, db_version=None):
+        """
+        Load ids and categories of all questions from database.
+
+        The version is read before the rows, so rows written in between make
+        the index look older than it is and rebuild it once more.
+
+        :param db_version: version of the questions table read already.
+        :return:
+        """
+        if db_version is None:
+            db_version = get_table_version(
+                Question.query.session, Question.__tablename__
+            )
+
+        rows = Question.query.with_entities(
+            Question.id, Question.category, Question.difficulty
+        ).order_by(Question.id).yield_per(STREAM_BATCH_SIZE)
+
+        ids = array('q')
+        ids_by_category = {}
+        ids_by_difficulty = {}
+        for question_id, category_id, difficulty in rows:
+            ids.append(question_id)
+            for key in get_difficulty_keys(category_id, difficulty):
+                ids_by_difficulty.setdefault(
+                    key, array('q')
+                ).append(question_id)
+
+            if category_id is not None:
+                ids_by_category.setdefault(
+                    category_id, array('q')
+                ).append(question_id)
+
+        self._ids = ids
+        self._ids_by_category = ids_by_category
+        self._ids_by_difficulty = ids_by_difficulty
+        self._snapshots = {}
+        self.version += 1
+        self.db_version = db_version
+        self._expires_at = time.monotonic() + self.ttl \
+            if self.ttl else float('inf')
+        self.built_at = time.time()
+
+    def _load(self):
+        """
+        Build index if it was not built yet, expired or is older.
+
+        :return:
+        """
+        db_version = get_current_version(Question.__tablename__)
+        with self._lock:
+            if time.monotonic() >= self._expires_at \
+                    or db_version not in (None, self.db_version):
+                self._build(db_version)
+
+    def _get_ids(self, category_id):
+        """
+        Return sorted ids of given category or all questions.
+
+        :param category_id:
+        :return:
+        """
+        if not category_id:
+            return self._ids
+
+        return self._ids_by_category.get(int(category_id), array('q'))
+
+    def _get_groups(self, category_id, difficulty):
+        """
+        Return sorted id arrays of given category within difficulty range.
+
+        :param category_id:
+        :param difficulty: smallest and largest difficulty or None for all.
+        :return: list of arrays.
+        """
+        if difficulty is None:
+            return [self._get_ids(category_id)]
+
+        category_id = int(category_id) if category_id else None
+        low, high = difficulty
+        return [
+            ids for (category, level), ids in self._ids_by_difficulty.items()
+            if category == category_id
+            and (low is None or level >= low)
+            and (high is None or level <= high)
+        ]
+
+    def rebuild(self):
+        """
+        Rebuild index from database.
+
+        :return:
+        """
+        with self._lock:
+            self._build()
+
+    def invalidate(self):
+        """
+        Drop index so it is rebuilt on next access.
+
+        :return:
+        """
+        with self._lock:
+            self._expires_at = 0
+
+    def update(self, writes, base_version=None, db_version=None):
+        """
+        Apply committed writes of questions in order.
+
+        Nothing is done if the index was not built, as it will be built
+        with the writes. The index is dropped instead if it did not hold the
+        version the writes were made on, as it misses other writes.
+
+        :param writes: question id, category id, difficulty and whether the
+            question was added or removed.
+        :param base_version: version of the questions table before writes.
+        :param db_version: version of the questions table after writes.
+        :return:
+        """
+        with self._lock:
+            if not self._expires_at:
+                return
+
+            if base_version is not None \
+                    and base_version != self.db_version:
+                self._expires_at = 0
+                return
+
+            if db_version is not None:
+                self.db_version = db_version
+
+            self.version += 1
+            self._snapshots = {}
+            for question_id, category_id, difficulty, added in writes:
+                keys = get_difficulty_keys(category_id, difficulty)
+                if not added:
+                    remove_id(self._ids, question_id)
+                    if category_id in self._ids_by_category:
+                        remove_id(
+                            self._ids_by_category[category_id], question_id
+                        )
+                    for key in keys:
+                        if key in self._ids_by_difficulty:
+                            remove_id(
+                                self._ids_by_difficulty[key], question_id
+                            )
+                    continue
+
+                insert_id(self._ids, question_id)
+                if category_id is not None:
+                    insert_id(
+                        self._ids_by_category.setdefault(
+                            category_id, array('q')
+                        ),
+                        question_id
+                    )
+                for key in keys:
+                    insert_id(
+                        self._ids_by_difficulty.setdefault(key, array('q')),
+                        question_id
+                    )
+
+    def count(self, category_id=None):
+        """
+        Return number of questions of given category or all questions.
+
+        :param category_id:
+        :return:
+        """
+        self._load()
+        with self._lock:
+            return len(self._get_ids(category_id))
+
+    def get_ids(self, category_id=None, difficulty=None):
+        """
+        Return sorted ids of questions of given category or all questions.
+
+        :param category_id:
+        :param difficulty: smallest and largest difficulty or None for all.
+        :return:
+        """
+        self._load()
+        with self._lock:
+            groups = self._get_groups(category_id, difficulty)
+            if len(groups) == 1:
+                return groups[0].tolist()
+
+            return sorted(itertools.chain.from_iterable(groups))
+
+    def get_snapshot(self, category_id=None):
+        """
+        Return array of sorted ids of given category or all questions.
+
+        The array is copied once per category and index change and shared by
+        all callers, which must not change it.
+
+        :param category_id:
+        :return:
+        """
+        self._load()
+        key = int(category_id) if category_id else None
+        with self._lock:
+            if key not in self._snapshots:
+                self._snapshots[key] = array('q', self._get_ids(category_id))
+
+            return self._snapshots[key]
+
+    def get_random_ids(self, category_id=None, count=1, exclude=(),
+                       difficulty=None):
+        """
+        Return ids of given number of distinct random questions.
+
+        Random positions are probed first, at most QUESTION_INDEX_MAX_PROBES
+        per id, which almost always succeeds as quizzes exclude few
+        questions. A position over several difficulties is found by
+        bisecting their cumulative sizes. Only when the probes hit excluded
+        or already picked ids the remaining ids are listed and sampled.
+
+        :param category_id:
+        :param count: number of ids.
+        :param exclude: ids of questions not to return.
+        :param difficulty: smallest and largest difficulty or None for all.
+        :return: list of fewer ids if not enough questions are left.
+        """
+        self._load()
+        exclude = {int(question_id) for question_id in exclude}
+        picked = []
+        with self._lock:
+            groups = self._get_groups(category_id, difficulty)
+            ends = list(itertools.accumulate(len(ids) for ids in groups))
+            if not ends or not ends[-1]:
+                return picked
+
+            for _ in range(count * QUESTION_INDEX_MAX_PROBES):
+                position = random.randrange(ends[-1])
+                group = bisect.bisect_right(ends, position)
+                if group:
+                    position -= ends[group - 1]
+
+                question_id = groups[group][position]
+                if question_id not in exclude:
+                    exclude.add(question_id)
+                    picked.append(question_id)
+                    if len(picked) == count:
+                        return picked
+
+            remaining = [
+                question_id
+                for question_id in itertools.chain.from_iterable(groups)
+                if question_id not in exclude
+            ]
+
+        return picked + random.sample(
+            remaining, min(count - len(picked), len(remaining))
+        )
+
+    def get_stats(self):
+        """
+        Return counts and size of index.
+
+        :return:
+        """
+        self._load()
+        with self._lock:
+            arrays = [
+                self._ids, *self._ids_by_category.values(),
+                *self._ids_by_difficulty.values()
+            ]
+            return {
+                'total_questions': len(self._ids),
+                'categories': {
+                    category_id: len(ids)
+                    for category_id, ids in self._ids_by_category.items()
+                },
+                'difficulties': {
+                    difficulty: len(ids)
+                    for (category_id, difficulty), ids
+                    in self._ids_by_difficulty.items() if category_id is None
+                },
+                'built_at': self.built_at,
+                'size_bytes': sum(
+                    len(ids) * ids.itemsize for ids in arrays
+                ),
+            }
+
+    def check(self, limit=100):
+        """
+        Compare index with database.
+
+        :param limit: max number of ids listed per difference.
+        :return:
+        """
+        self._load()
+        expected = QuestionIndex(ttl=None)
+        expected._build()
+
+        with self._lock:
+            missing = set(expected._ids).difference(self._ids)
+            unexpected = set(self._ids).difference(expected._ids)
+            categories = set(expected._ids_by_category) | set(
+                self._ids_by_category
+            )
+            wrong_categories = sorted(
+                category_id for category_id in categories
+                if self._ids_by_category.get(category_id) !=
+                expected._ids_by_category.get(category_id)
+            )
+            keys = set(expected._ids_by_difficulty) | set(
+                self._ids_by_difficulty
+            )
+            wrong_difficulties = sorted(
+                key for key in keys
+                if list(self._ids_by_difficulty.get(key, ())) !=
+                list(expected._ids_by_difficulty.get(key, ()))
+            )
+
+        return {
+            'consistent': not (
+                missing or unexpected or wrong_categories or wrong_difficulties
+            ),
+            'missing': sorted(missing)[:limit],
+            'unexpected': sorted(unexpected)[:limit],
+            'categories': wrong_categories,
+            'difficulties': [
+                {'category': category_id, 'difficulty': difficulty}
+                for category_id, difficulty in wrong_difficulties
+            ],
+        }
+
+
+def get_question_index():
+    """
+    Return question index of the current app.
+
+    :return:
+    """
+    return current_app.extensions['question_index']
+
+
+def has_question_index():
+    """
+    Return whether the current app has a question index.
+
+    :return:
+    """
+    return has_app_context() and 'question_index' in current_app.extensions
+
+
+def invalidate_question_index():
+    """
+    Drop question index of the current app after writes it cannot follow.
+
+    :return:
+    """
+    if has_question_index():
+        get_question_index().invalidate()
+
+
+def _get_index_key(instance_or_values):
+    """
+    Return category and difficulty of a question as stored by the database.
+
+    Attributes keep the values given by the client until they are reloaded,
+    e.g. strings posted by a form, while the columns hold integers.
+
+    :param instance_or_values: question or pair of category and difficulty.
+    :return: category, difficulty
+    """
+    if isinstance(instance_or_values, Question):
+        instance_or_values = (
+            instance_or_values.category, instance_or_values.difficulty
+        )
+
+    return tuple(
+        None if value is None else int(value) for value in instance_or_values
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_question_writes(session, flush_context):
+    """
+    Record questions added, moved or removed in flush.
+
+    :param session:
+    :param flush_context:
+    :return:
+    """
+    writes = session.info.setdefault('question_writes', [])
+
+    for instance in session.deleted:
+        if isinstance(instance, Question):
+            writes.append((instance.id, *_get_index_key(instance), False))
+        elif isinstance(instance, Category):
+            # Questions of deleted categories are updated by the database.
+            session.info['question_index_stale'] = True
+
+    for instance in session.dirty:
+        if isinstance(instance, Question):
+            attrs = inspect(instance).attrs
+            old_values = []
+            for attr in (attrs.category, attrs.difficulty):
+                history = attr.history
+                if history.has_changes():
+                    old_values.append(
+                        history.deleted[0] if history.deleted else None
+                    )
+                else:
+                    old_values.append(attr.value)
+
+            old_key = _get_index_key(old_values)
+            if old_key != _get_index_key(instance):
+                writes.append((instance.id, *old_key, False))
+                writes.append((instance.id, *_get_index_key(instance), True))
+
+    for instance in session.new:
+        if isinstance(instance, Question):
+            writes.append((instance.id, *_get_index_key(instance), True))
+
+
+@event.listens_for(Session, 'before_flush')
+def _lock_question_version(session, flush_context, instances):
+    """
+    Read and lock version of questions table before the first question write.
+
+    :param session:
+    :param flush_context:
+    :param instances:
+    :return:
+    """
+    if 'question_base_version' in session.info or not has_question_index():
+        return
+
+    if any(isinstance(instance, Question) for instance in itertools.chain(
+            session.new, session.dirty, session.deleted)):
+        session.info['question_base_version'] = get_table_version(
+            session, Question.__tablename__, lock=True
+        )
+
+
+@event.listens_for(Session, 'before_commit')
+def _read_question_version(session):
+    """
+    Read version of questions table including the writes being committed.
+
+    :param session:
+    :return:
+    """
+    if not has_question_index():
+        return
+
+    session.flush()
+    if session.info.get('question_writes'):
+        session.info['question_version'] = get_table_version(
+            session, Question.__tablename__
+        )
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def _track_bulk_question_writes(context):
+    """
+    Mark question index stale after a bulk update or delete of questions.
+
+    The rows written by the statement are not known, so the index is
+    rebuilt on next access after commit.
+
+    :param context: bulk update or delete context.
+    :return:
+    """
+    if context.mapper.class_ is Question:
+        context.session.info['question_index_stale'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _update_question_index(session):
+    """
+    Apply committed question writes to the question index.
+
+    :param session:
+    :return:
+    """
+    writes = session.info.pop('question_writes', [])
+    stale = session.info.pop('question_index_stale', False)
+    base_version = session.info.pop('question_base_version', None)
+    db_version = session.info.pop('question_version', None)
+    if not has_question_index():
+        return
+
+    if stale:
+        get_question_index().invalidate()
+    elif writes:
+        get_question_index().update(writes, base_version, db_version)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_question_writes(session):
+    """
+    Forget question writes of a rolled back transaction.
+
+    :param session:
+    :return:
+    """
+    session.info.pop('question_writes', None)
+    session.info.pop('question_index_stale', None)
+    session.info.pop('question_base_version', None)
+    session.info.pop('question_version', None)
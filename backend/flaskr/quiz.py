@@ -0,0 +1,186 @@
+"""Quiz module for flaskr app."""
+
+import random
+
+from flaskr.constants import (
+    QUESTION_INDEX_MAX_PROBES, QUIZ_STRATEGY_LEAST_ASKED, QUIZ_STRATEGY_UNIFORM
+)
+from flaskr.question_index import get_question_index
+from flaskr.sampling import get_question_sampler
+from flaskr.utils import get_question_records_by_ids
+
+from models import Question
+
+from sqlalchemy import func
+
+
+def get_quiz_query(category_id=None, difficulty=None):
+    """
+    Return query of questions of given category or all questions.
+
+    :param category_id:
+    :param difficulty: smallest and largest difficulty or None for all.
+    :return:
+    """
+    questions = Question.query
+    if category_id:
+        questions = questions.filter(Question.category == category_id)
+
+    if difficulty is not None:
+        low, high = difficulty
+        if low is not None:
+            questions = questions.filter(Question.difficulty >= low)
+        if high is not None:
+            questions = questions.filter(Question.difficulty <= high)
+
+    return questions
+
+
+def get_id_range_query(questions):
+    """
+    Return query of smallest and largest id of given questions query.
+
+    :param questions: questions query.
+    :return:
+    """
+    return questions.with_entities(
+        func.min(Question.id).label('min_id'),
+        func.max(Question.id).label('max_id')
+    )
+
+
+def get_pivot_queries(questions, pivot, previous_questions=()):
+    """
+    Return queries of the nearest question at or after and before pivot.
+
+    :param questions: questions query.
+    :param pivot: random question id.
+    :param previous_questions: ids of already asked questions.
+    :return: after query, before query
+    """
+    if previous_questions:
+        questions = questions.filter(~Question.id.in_(previous_questions))
+
+    return (
+        questions.filter(Question.id >= pivot).order_by(Question.id).limit(1),
+        questions.filter(
+            Question.id < pivot
+        ).order_by(Question.id.desc()).limit(1)
+    )
+
+
+def get_probe_query(questions, id_range, count, previous_questions=()):
+    """
+    Return query of questions with random ids in given id range.
+
+    At most QUESTION_INDEX_MAX_PROBES ids per question are probed, so the
+    query reads a bounded number of rows by primary key whatever the size
+    of the table. Ids of deleted questions are missed, so fewer questions
+    than asked may be returned.
+
+    :param questions: questions query.
+    :param id_range: smallest and largest id of questions.
+    :param count: number of questions.
+    :param previous_questions: ids of already asked questions.
+    :return:
+    """
+    min_id, max_id = id_range
+    population = range(min_id, max_id + 1)
+    probes = random.sample(
+        population,
+        min(count * QUESTION_INDEX_MAX_PROBES, len(population))
+    )
+    questions = questions.filter(Question.id.in_(probes))
+    if previous_questions:
+        questions = questions.filter(~Question.id.in_(previous_questions))
+
+    return questions.limit(count)
+
+
+def in_difficulty(question, difficulty):
+    """
+    Return whether question is within given difficulty range.
+
+    :param question: question record.
+    :param difficulty: smallest and largest difficulty or None for all.
+    :return:
+    """
+    if difficulty is None:
+        return True
+
+    low, high = difficulty
+    return question.difficulty is not None \
+        and (low is None or question.difficulty >= low) \
+        and (high is None or question.difficulty <= high)
+
+
+def get_random_questions(category_id=None, previous_questions=(), count=1,
+                         difficulty=None, strategy=QUIZ_STRATEGY_UNIFORM):
+    """
+    Return given number of distinct random questions not in previous ones.
+
+    The ids are picked from the question index, uniformly or favouring
+    questions asked less often, and only those questions are loaded, in one
+    query. Ids of questions deleted or changed by another process make the
+    index rebuild and other ids are picked for them.
+
+    :param category_id:
+    :param previous_questions: ids of already asked questions.
+    :param count: number of questions.
+    :param difficulty: smallest and largest difficulty or None for all.
+    :param strategy: uniform or least_asked.
+    :return: list of fewer question records if not enough are left.
+    """
+    question_index = get_question_index()
+    question_sampler = get_question_sampler()
+    previous_questions = set(previous_questions)
+    questions = []
+    for _ in range(QUESTION_INDEX_MAX_PROBES):
+        if strategy == QUIZ_STRATEGY_LEAST_ASKED:
+            question_ids = question_sampler.get_random_ids(
+                question_index, category_id, count - len(questions),
+                previous_questions, difficulty
+            )
+        else:
+            question_ids = question_index.get_random_ids(
+                category_id, count - len(questions), previous_questions,
+                difficulty
+            )
+        if not question_ids:
+            break
+
+        records = get_question_records_by_ids(question_ids)
+        stale = False
+        for question_id in question_ids:
+            previous_questions.add(question_id)
+            question = records.get(question_id)
+            if question and in_difficulty(question, difficulty) and (
+                    not category_id or question.category == int(category_id)):
+                questions.append(question)
+            else:
+                stale = True
+
+        if not stale:
+            break
+
+        question_index.invalidate()
+
+    question_sampler.record(question.id for question in questions)
+    return questions
+
+
+def get_random_question(category_id=None, previous_questions=(),
+                        difficulty=None, strategy=QUIZ_STRATEGY_UNIFORM):
+    """
+    Return random question not in previous questions.
+
+    :param category_id:
+    :param previous_questions: ids of already asked questions.
+    :param difficulty: smallest and largest difficulty or None for all.
+    :param strategy: uniform or least_asked.
+    :return: question record or None if no question is left.
+    """
+    questions = get_random_questions(
+        category_id, previous_questions, 1, difficulty, strategy
+    )
+    return questions[0] if questions else None
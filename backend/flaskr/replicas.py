@@ -0,0 +1,85 @@
+"""Read replica module for flaskr app."""
+
+import functools
+import time
+
+from flask import current_app, request
+
+from flaskr.constants import READ_YOUR_WRITES_COOKIE, READ_YOUR_WRITES_SECONDS
+
+from models import db
+
+
+def get_read_your_writes_window():
+    """
+    Return seconds a client reads from the primary after it wrote.
+
+    :return:
+    """
+    return current_app.config.get(
+        'READ_YOUR_WRITES_SECONDS', READ_YOUR_WRITES_SECONDS
+    )
+
+
+def has_recent_write():
+    """
+    Return whether the client of the current request wrote recently.
+
+    :return:
+    """
+    try:
+        last_write = float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0))
+    except ValueError:
+        return False
+
+    return time.time() - last_write < get_read_your_writes_window()
+
+
+def read_replica(view):
+    """
+    Read from a replica in a route, unless the client wrote recently.
+
+    Replicas lag behind the primary, so a client reads from the primary for
+    READ_YOUR_WRITES_SECONDS after a write to see its own changes.
+
+    :param view:
+    :return:
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_app.extensions.get('db_replicas') \
+                and not has_recent_write():
+            db.session.info['use_replica'] = True
+
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def mark_writes(response):
+    """
+    Set the last write cookie if the current request wrote to the database.
+
+    :param response:
+    :return:
+    """
+    if not current_app.extensions.get('db_replicas') \
+            or not db.session.info.get('wrote'):
+        return response
+
+    window = get_read_your_writes_window()
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE, str(time.time()), max_age=window,
+        httponly=True, samesite='Lax'
+    )
+    return response
+
+
+def init_app(app):
+    """
+    Track writes of given app for read your writes consistency.
+
+    :param app:
+    :return:
+    """
+    app.after_request(mark_writes)
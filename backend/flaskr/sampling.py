@@ -0,0 +1,237 @@
+"""Weighted question sampling module for flaskr app."""
+
+import bisect
+import random
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+from flaskr.constants import MAX_SAMPLING_TREES, QUESTION_INDEX_MAX_PROBES
+
+
+class WeightTree:
+    """
+    Binary indexed tree of weights.
+
+    Holds cumulative weights so a weight is changed and a position is drawn
+    with probability proportional to its weight in O(log n).
+    """
+
+    def __init__(self, weights):
+        """
+        Init method.
+
+        :param weights: list of non negative weights.
+        """
+        self._weights = list(weights)
+        self._tree = [0.0] + self._weights
+        for position in range(1, len(self._tree)):
+            parent = position + (position & -position)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[position]
+
+        self._step = 1 << (len(self._weights).bit_length() - 1) \
+            if self._weights else 0
+
+    def __len__(self):
+        """
+        Return number of weights.
+
+        :return:
+        """
+        return len(self._weights)
+
+    @property
+    def total(self):
+        """
+        Return sum of all weights.
+
+        :return:
+        """
+        total = 0.0
+        position = len(self._weights)
+        while position:
+            total += self._tree[position]
+            position -= position & -position
+
+        return total
+
+    def get(self, position):
+        """
+        Return weight at given position.
+
+        :param position:
+        :return:
+        """
+        return self._weights[position]
+
+    def set(self, position, weight):
+        """
+        Change weight at given position.
+
+        :param position:
+        :param weight:
+        :return:
+        """
+        delta = weight - self._weights[position]
+        self._weights[position] = weight
+        position += 1
+        while position < len(self._tree):
+            self._tree[position] += delta
+            position += position & -position
+
+    def find(self, value):
+        """
+        Return position whose cumulative weight range holds given value.
+
+        :param value: number from 0 up to the total weight.
+        :return:
+        """
+        position = 0
+        step = self._step
+        while step:
+            child = position + step
+            if child < len(self._tree) and self._tree[child] <= value:
+                position = child
+                value -= self._tree[child]
+            step >>= 1
+
+        return min(position, len(self._weights) - 1)
+
+
+class QuestionSampler:
+    """
+    Sampler of questions weighted by how often they were asked.
+
+    A question asked n times has weight 1 / (n + 1), so questions asked
+    less often are favoured. A weight tree is built per category and
+    difficulty range from the question index on first use and rebuilt when
+    the index changes. Counts are kept per process.
+    """
+
+    def __init__(self, max_trees=MAX_SAMPLING_TREES):
+        """
+        Init method.
+
+        :param max_trees: trees kept, least recently used are dropped above.
+        """
+        self.max_trees = max_trees
+        self._lock = threading.Lock()
+        self._asked = {}
+        self._trees = OrderedDict()
+
+    def _get_weight(self, question_id):
+        """
+        Return weight of given question.
+
+        :param question_id:
+        :return:
+        """
+        return 1.0 / (self._asked.get(question_id, 0) + 1)
+
+    def _get_tree(self, question_index, category_id, difficulty):
+        """
+        Return ids and weight tree of given category and difficulty range.
+
+        :param question_index:
+        :param category_id:
+        :param difficulty: smallest and largest difficulty or None for all.
+        :return: sorted ids, weight tree
+        """
+        key = (int(category_id) if category_id else None, difficulty)
+        version = question_index.version
+        entry = self._trees.get(key)
+        if entry is None or entry[0] != version:
+            ids = question_index.get_ids(category_id, difficulty)
+            tree = WeightTree(
+                self._get_weight(question_id) for question_id in ids
+            )
+            entry = self._trees[key] = (version, ids, tree)
+            if len(self._trees) > self.max_trees:
+                self._trees.popitem(last=False)
+
+        self._trees.move_to_end(key)
+        return entry[1], entry[2]
+
+    def get_random_ids(self, question_index, category_id=None, count=1,
+                       exclude=(), difficulty=None):
+        """
+        Return ids of given number of distinct questions drawn by weight.
+
+        Excluded and drawn questions get weight 0 for the draw, which costs
+        O(log n) each.
+
+        :param question_index:
+        :param category_id:
+        :param count: number of ids.
+        :param exclude: ids of questions not to return.
+        :param difficulty: smallest and largest difficulty or None for all.
+        :return: list of fewer ids if not enough questions are left.
+        """
+        picked = []
+        with self._lock:
+            ids, tree = self._get_tree(question_index, category_id, difficulty)
+            removed = {}
+            for question_id in set(map(int, exclude)):
+                position = bisect.bisect_left(ids, question_id)
+                if position < len(ids) and ids[position] == question_id:
+                    removed[position] = tree.get(position)
+                    tree.set(position, 0.0)
+
+            available = len(ids) - len(removed)
+            for _ in range(count * QUESTION_INDEX_MAX_PROBES):
+                if len(picked) == count or not available:
+                    break
+
+                position = tree.find(random.random() * tree.total)
+                if not tree.get(position):
+                    # Rounding of cumulative weights hit a removed question.
+                    continue
+
+                picked.append(ids[position])
+                removed[position] = tree.get(position)
+                tree.set(position, 0.0)
+                available -= 1
+
+            for position, weight in removed.items():
+                tree.set(position, weight)
+
+        return picked
+
+    def record(self, question_ids):
+        """
+        Count given questions as asked and lower their weights.
+
+        :param question_ids:
+        :return:
+        """
+        with self._lock:
+            for question_id in question_ids:
+                self._asked[question_id] = self._asked.get(question_id, 0) + 1
+                weight = self._get_weight(question_id)
+                for _, ids, tree in self._trees.values():
+                    position = bisect.bisect_left(ids, question_id)
+                    if position < len(ids) and ids[position] == question_id:
+                        tree.set(position, weight)
+
+    def get_stats(self):
+        """
+        Return number of asked questions and trees.
+
+        :return:
+        """
+        with self._lock:
+            return {
+                'asked_questions': len(self._asked),
+                'trees': len(self._trees),
+            }
+
+
+def get_question_sampler():
+    """
+    Return question sampler of the current app.
+
+    :return:
+    """
+    return current_app.extensions['question_sampler']
@@ -0,0 +1,203 @@
+"""Quiz sessions module for flaskr app."""
+
+import hashlib
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+
+from flaskr.constants import (
+    MAX_QUIZ_SESSIONS, QUIZ_PERMUTATION_ROUNDS, QUIZ_SESSION_TTL
+)
+
+
+def permute(position, size, seed):
+    """
+    Return given position in a random permutation of range(size).
+
+    A Feistel network keyed by seed permutes the smallest range of an even
+    number of bits holding size. Positions it maps outside size are mapped
+    again until they fall inside, which takes less than four rounds on
+    average. Nothing is stored, so any position is found in O(1).
+
+    :param position:
+    :param size:
+    :param seed: bytes.
+    :return:
+    """
+    half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half_bits) - 1
+    while True:
+        left, right = position >> half_bits, position & mask
+        for round_number in range(QUIZ_PERMUTATION_ROUNDS):
+            digest = hashlib.blake2b(
+                right.to_bytes(8, 'little'), digest_size=8, key=seed,
+                person=round_number.to_bytes(1, 'little')
+            ).digest()
+            left, right = right, left ^ (
+                int.from_bytes(digest, 'little') & mask
+            )
+
+        position = (left << half_bits) | right
+        if position < size:
+            return position
+
+
+class QuizSession:
+    """
+    Quiz session asking questions of an id array in random order.
+
+    Only a seed and the number of asked questions are kept per session; the
+    order is derived from the seed. The id array is not copied, so sessions
+    started from the same question index state share it.
+    """
+
+    def __init__(self, question_ids, session_id=None, seed=None, asked=0):
+        """
+        Init method.
+
+        :param question_ids: array of ids of questions to ask.
+        :param session_id:
+        :param seed: bytes keying the order of questions.
+        :param asked: number of questions asked already.
+        """
+        self.id = session_id or secrets.token_urlsafe(16)
+        self.question_ids = question_ids
+        self.seed = seed or secrets.token_bytes(16)
+        self.asked = asked
+
+    @classmethod
+    def start(cls, question_ids):
+        """
+        Start new session asking given questions in random order.
+
+        :param question_ids: array of ids, other iterables are copied into
+            one.
+        :return:
+        """
+        if not isinstance(question_ids, array):
+            question_ids = array('q', question_ids)
+
+        return cls(question_ids)
+
+    def next_question_id(self):
+        """
+        Return id of the next question to ask.
+
+        :return: question id or None if no question is left.
+        """
+        if not self.remaining:
+            return None
+
+        position = permute(self.asked, len(self.question_ids), self.seed)
+        self.asked += 1
+        return self.question_ids[position]
+
+    @property
+    def remaining(self):
+        """
+        Return number of questions left to ask.
+
+        :return:
+        """
+        return len(self.question_ids) - self.asked
+
+
+class QuizSessionBackend(ABC):
+    """Interface of quiz session storage."""
+
+    @abstractmethod
+    def get(self, session_id):
+        """
+        Return session by given session id.
+
+        :param session_id:
+        :return: session or None if it does not exist or expired.
+        """
+
+    @abstractmethod
+    def save(self, session):
+        """
+        Store given session.
+
+        :param session:
+        :return:
+        """
+
+    @abstractmethod
+    def delete(self, session_id):
+        """
+        Remove session by given session id.
+
+        :param session_id:
+        :return:
+        """
+
+
+class InMemoryQuizSessionBackend(QuizSessionBackend):
+    """Process local session storage with LRU and TTL eviction."""
+
+    def __init__(self, max_sessions=MAX_QUIZ_SESSIONS, ttl=QUIZ_SESSION_TTL):
+        """
+        Init method.
+
+        :param max_sessions: least recently used sessions above it are evicted.
+        :param ttl: seconds of inactivity after which a session expires.
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    def get(self, session_id):
+        """
+        Return session by given session id.
+
+        :param session_id:
+        :return: session or None if it does not exist or expired.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+
+            expires_at, session = entry
+            if expires_at <= time.monotonic():
+                del self._sessions[session_id]
+                return None
+
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def save(self, session):
+        """
+        Store given session.
+
+        :param session:
+        :return:
+        """
+        with self._lock:
+            self._sessions[session.id] = (time.monotonic() + self.ttl, session)
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        """
+        Remove session by given session id.
+
+        :param session_id:
+        :return:
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        """
+        Return number of stored sessions.
+
+        :return:
+        """
+        return len(self._sessions)
@@ -1,20 +1,31 @@
 """Utils module for flaskr app."""
 
-from flaskr.constants import QUESTIONS_PER_PAGE
+from flaskr.cache import get_category_cache
+from flaskr.constants import (
+    QUESTIONS_PER_PAGE, SEARCH_MODE_FULLTEXT, SEARCH_MODE_SUBSTRING,
+    STREAM_BATCH_SIZE
+)
+from flaskr.question_index import get_question_index
 
-from models import Category, Question
+from models import (
+    Question, QuestionRecord, db, question_columns, question_search_vector,
+    search_config
+)
 
+from sqlalchemy import func, literal_column
 
-def get_page_range(page):
+
+def get_page_range(page, per_page=QUESTIONS_PER_PAGE):
     """
     Get page range.
 
     :param page:
+    :param per_page:
     :return: start, end
     """
     page_index = page - 1
-    start = page_index * QUESTIONS_PER_PAGE
-    end = start + QUESTIONS_PER_PAGE
+    start = page_index * per_page
+    end = start + per_page
     return start, end
 
 
@@ -24,42 +35,135 @@ def get_all_categories():
 
     :return:
     """
-    categories = {}
-    for category in Category.query.all():
-        categories[category.id] = category.type
-
-    return categories
+    return get_category_cache().get_all()
 
 
 def get_category_by_id(category_id):
     """
-    Return category by given category_id id.
+    Return formatted category by given category_id id.
 
     :param category_id:
     :return:
     """
-    return Category.query.get(category_id)
+    return get_category_cache().get(category_id)
 
 
-def get_all_questions(query=None, category_id=None):
+def get_search_query(query, search_mode=SEARCH_MODE_SUBSTRING):
     """
-    Return list of all questions.
+    Return query of questions matching given search term.
+
+    Full-text mode matches words and orders questions by relevance. It
+    needs PostgreSQL and falls back to substring matching elsewhere.
+
+    :param query:
+    :param search_mode:
+    :return:
+    """
+    is_postgres = db.session.get_bind().dialect.name == 'postgresql'
+    if search_mode == SEARCH_MODE_FULLTEXT and is_postgres:
+        search_query = func.plainto_tsquery(
+            literal_column(f"'{search_config}'"), query
+        )
+        return Question.query.filter(
+            question_search_vector.op('@@')(search_query)
+        ).order_by(
+            func.ts_rank(question_search_vector, search_query).desc(),
+            Question.id
+        )
+
+    return Question.query.filter(
+        Question.question.ilike(f'%{query}%')
+    ).order_by(Question.id)
+
+
+def get_questions_query(query=None, category_id=None,
+                        search_mode=SEARCH_MODE_SUBSTRING):
+    """
+    Return query of questions matching given search term or category.
 
     :param query:
     :param category_id:
+    :param search_mode:
     :return:
     """
     if query:
-        questions = Question.query.filter(
-            Question.question.ilike(f'%{query}%')
-        )
-    elif category_id:
-        questions = Question.query.filter_by(category=category_id)
-    else:
-        questions = Question.query.order_by(Question.id).all()
+        return get_search_query(query, search_mode)
+
+    questions = Question.query
+    if category_id:
+        questions = questions.filter(Question.category == category_id)
+
+    return questions.order_by(Question.id)
 
-    serialized_data = [question.format() for question in questions]
-    return serialized_data
+
+def get_all_questions(query=None, category_id=None,
+                      search_mode=SEARCH_MODE_SUBSTRING):
+    """
+    Return list of all questions.
+
+    :param query:
+    :param category_id:
+    :param search_mode:
+    :return:
+    """
+    return get_question_records(
+        get_questions_query(query, category_id, search_mode)
+    )
+
+
+def get_question_records(questions):
+    """
+    Return question records of given questions query.
+
+    Only the question columns are selected, so rows are plain tuples and no
+    ORM instances are built.
+
+    :param questions: questions query.
+    :return:
+    """
+    rows = questions.with_entities(*question_columns)
+    return [QuestionRecord(*row) for row in rows]
+
+
+def get_questions_page(questions, page, per_page=QUESTIONS_PER_PAGE):
+    """
+    Return list of questions of given page of questions query.
+
+    Only the rows of the requested page are loaded from the database.
+
+    :param questions: questions query.
+    :param page:
+    :param per_page:
+    :return:
+    """
+    if page < 1:
+        return []
+
+    return get_question_records(get_page_query(questions, page, per_page))
+
+
+def get_first_question_record(questions):
+    """
+    Return question record of the first question of given questions query.
+
+    :param questions: questions query.
+    :return: question record or None if the query matches no question.
+    """
+    row = questions.with_entities(*question_columns).first()
+    return QuestionRecord(*row) if row else None
+
+
+def get_page_query(questions, page, per_page=QUESTIONS_PER_PAGE):
+    """
+    Return query of given page of questions query.
+
+    :param questions: questions query.
+    :param page:
+    :param per_page:
+    :return:
+    """
+    start, _ = get_page_range(page, per_page)
+    return questions.offset(start).limit(per_page)
 
 
 def get_questions_by_page(page):
@@ -69,9 +173,129 @@ def get_questions_by_page(page):
     :param page:
     :return:
     """
-    start, end = get_page_range(page)
-    questions = get_all_questions()
-    return questions[start:end]
+    return get_questions_page(get_questions_query(), page)
+
+
+def count_questions(questions):
+    """
+    Return number of questions matched by given questions query.
+
+    :param questions: questions query.
+    :return:
+    """
+    return get_count_query(questions).scalar()
+
+
+def get_count_query(questions):
+    """
+    Return query counting questions matched by given questions query.
+
+    :param questions: questions query.
+    :return:
+    """
+    return questions.order_by(None).with_entities(func.count(Question.id))
+
+
+def iter_questions(questions, batch_size=STREAM_BATCH_SIZE):
+    """
+    Yield questions of given questions query.
+
+    Rows are fetched from a server side cursor in batches, so memory use does
+    not depend on the number of questions.
+
+    :param questions: questions query.
+    :param batch_size:
+    :return:
+    """
+    rows = questions.with_entities(*question_columns).yield_per(batch_size)
+    for row in rows:
+        yield QuestionRecord(*row)
+
+
+def get_questions_after(after_id, limit=QUESTIONS_PER_PAGE, category_id=None):
+    """
+    Return list of questions after given question id and the next cursor.
+
+    Seeks on the primary key, so the cost does not grow with the position
+    of the cursor.
+
+    :param after_id:
+    :param limit:
+    :param category_id:
+    :return: questions, next_cursor
+    """
+    questions = get_questions_after_query(after_id, limit, category_id)
+    return get_cursor_page(get_question_records(questions), limit)
+
+
+def get_questions_after_query(after_id, limit=QUESTIONS_PER_PAGE,
+                              category_id=None):
+    """
+    Return query of questions after given question id.
+
+    One question more than the limit is fetched to tell whether a next
+    page exists.
+
+    :param after_id:
+    :param limit:
+    :param category_id:
+    :return:
+    """
+    questions = Question.query.filter(Question.id > after_id)
+    if category_id:
+        questions = questions.filter_by(category=category_id)
+
+    return questions.order_by(Question.id).limit(limit + 1)
+
+
+def get_cursor_page(questions, limit):
+    """
+    Split questions fetched by questions after query into page and cursor.
+
+    :param questions: question records.
+    :param limit:
+    :return: questions, next_cursor
+    """
+    if len(questions) <= limit:
+        return questions, None
+
+    return questions[:limit], questions[limit - 1].id
+
+
+def get_total_questions(category_id=None):
+    """
+    Return total number of questions.
+
+    Read from the question index, without a query.
+
+    :param category_id:
+    :return:
+    """
+    return get_question_index().count(category_id)
+
+
+def get_question_ids(category_id=None):
+    """
+    Return ids of all questions or questions of given category.
+
+    :param category_id:
+    :return: read-only array shared until questions change.
+    """
+    return get_question_index().get_snapshot(category_id)
+
+
+def get_question_ids_query(category_id=None):
+    """
+    Return query of ids of all questions or questions of given category.
+
+    :param category_id:
+    :return:
+    """
+    questions = Question.query.with_entities(Question.id)
+    if category_id:
+        questions = questions.filter(Question.category == category_id)
+
+    return questions
 
 
 def get_question_by_id(question_id):
@@ -84,6 +308,48 @@ def get_question_by_id(question_id):
     return Question.query.get(question_id)
 
 
+def get_question_record(question_id):
+    """
+    Return read-only question record by given question id.
+
+    :param question_id:
+    :return: question record or None if it does not exist.
+    """
+    return get_first_question_record(
+        Question.query.filter(Question.id == question_id)
+    )
+
+
+def get_question_records_by_ids(question_ids):
+    """
+    Return read-only question records of given ids in one query.
+
+    :param question_ids:
+    :return: dict of question id and record, missing ids are left out.
+    """
+    if not question_ids:
+        return {}
+
+    questions = Question.query.filter(Question.id.in_(question_ids))
+    return {
+        question.id: question for question in get_question_records(questions)
+    }
+
+
+def get_question_categories(question_ids):
+    """
+    Return ids of categories of questions of given ids.
+
+    :param question_ids:
+    :return: set of category ids.
+    """
+    return {
+        category_id for category_id, in Question.query.filter(
+            Question.has_ids(question_ids)
+        ).with_entities(Question.category).distinct()
+    }
+
+
 def add_new_question(question):
     """
     Add new question to db.
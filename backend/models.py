@@ -1,12 +1,109 @@
 """Module for model."""
 
-from flask_sqlalchemy import SQLAlchemy
-
-from sqlalchemy import Column, Integer, String
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+
+from sqlalchemy import (
+    BigInteger, Column, DDL, DateTime, ForeignKey, Index, Integer, String,
+    any_, bindparam, create_engine, event, exc, func, inspect,
+    literal_column, orm
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool
 
 database_name = "trivia"
 
-db = SQLAlchemy()
+search_config = "english"
+
+POOL_MODE_QUEUE = 'queue'
+POOL_MODE_PGBOUNCER = 'pgbouncer'
+
+BALANCING_ROUND_ROBIN = 'round_robin'
+BALANCING_LEAST_CONNECTIONS = 'least_connections'
+
+pool_settings = {
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+    'DB_POOL_MODE': POOL_MODE_QUEUE,
+    'DB_REPLICA_BALANCING': BALANCING_ROUND_ROBIN,
+}
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session reading from a replica when asked to.
+
+    Reads go to a replica once use_replica is set in the session info. The
+    session keeps the replica it picked, and goes back to the primary for
+    the rest of its life as soon as it writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        """
+        Return engine of the replica or the primary.
+
+        :param mapper:
+        :param clause:
+        :return:
+        """
+        replicas = self.app.extensions.get('db_replicas')
+        if replicas and self.info.get('use_replica') \
+                and not self._flushing and not self.info.get('wrote'):
+            if 'replica' not in self.info:
+                self.info['replica'] = replicas.choose()
+
+            return self.info['replica']
+
+        return super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _track_writes(session, flush_context):
+    """
+    Mark session as written, so it reads from the primary from now on.
+
+    :param session:
+    :param flush_context:
+    :return:
+    """
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_bulk_update')
+@event.listens_for(RoutingSession, 'after_bulk_delete')
+def _track_bulk_writes(context):
+    """
+    Mark session as written after a bulk update or delete.
+
+    :param context: bulk update or delete context.
+    :return:
+    """
+    context.session.info['wrote'] = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy service with sessions routing reads to replicas."""
+
+    def create_session(self, options):
+        """
+        Create factory of routing sessions.
+
+        :param options: keyword arguments of the session class.
+        :return:
+        """
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
 
 
 def get_database_path(db_name=database_name, is_postgres_user=True):
@@ -24,30 +121,389 @@ def get_database_path(db_name=database_name, is_postgres_user=True):
         'postgres', 'postgres', 'localhost:5432', db_name)
 
 
-def setup_db(app, database_uri=get_database_path()):
+class TimedQueuePool(QueuePool):
+    """Queue pool keeping statistics of connection checkouts."""
+
+    def __init__(self, *args, **kwargs):
+        """
+        Init method.
+
+        :param args:
+        :param kwargs:
+        """
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+
+    def _do_get(self):
+        """
+        Get connection from pool and record time spent waiting for it.
+
+        :return:
+        """
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_time += time.perf_counter() - start
+
+
+def get_setting(config, name):
+    """
+    Return pool setting from app config, environment or default.
+
+    :param config: app config.
+    :param name:
+    :return:
+    """
+    default = pool_settings[name]
+    value = config.get(name, os.environ.get(name))
+    if value is None:
+        return default
+
+    if isinstance(default, bool) and isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+
+    return type(default)(value)
+
+
+def get_engine_options(config, database_uri):
+    """
+    Return connection pool options of engine for given database.
+
+    In PgBouncer mode connections are not pooled by the app, as PgBouncer
+    already pools them in transaction mode.
+
+    :param config: app config.
+    :param database_uri:
+    :return:
+    """
+    if make_url(database_uri).get_backend_name() == 'sqlite':
+        return {}
+
+    if get_setting(config, 'DB_POOL_MODE') == POOL_MODE_PGBOUNCER:
+        return {'poolclass': NullPool}
+
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': get_setting(config, 'DB_POOL_SIZE'),
+        'max_overflow': get_setting(config, 'DB_MAX_OVERFLOW'),
+        'pool_timeout': get_setting(config, 'DB_POOL_TIMEOUT'),
+        'pool_recycle': get_setting(config, 'DB_POOL_RECYCLE'),
+        'pool_pre_ping': get_setting(config, 'DB_POOL_PRE_PING'),
+    }
+
+
+class ReplicaRouter:
+    """
+    Engines of read replicas and the balancing of reads between them.
+
+    Round robin takes replicas in turn. Least connections takes the replica
+    with the fewest connections checked out by this process, in turn among
+    equals.
+    """
+
+    def __init__(self, engines, balancing=BALANCING_ROUND_ROBIN):
+        """
+        Init method.
+
+        :param engines: engines of the replicas.
+        :param balancing: round_robin or least_connections.
+        """
+        self.engines = engines
+        self.balancing = balancing
+        self._lock = threading.Lock()
+        self._turn = 0
+        self._in_use = {engine: 0 for engine in engines}
+        self._checkouts = {engine: 0 for engine in engines}
+        for engine in engines:
+            self._track(engine)
+
+    def _track(self, engine):
+        """
+        Count connections checked out of given engine.
+
+        :param engine:
+        :return:
+        """
+        @event.listens_for(engine, 'checkout')
+        def checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self._in_use[engine] += 1
+                self._checkouts[engine] += 1
+
+        @event.listens_for(engine, 'checkin')
+        def checkin(dbapi_connection, connection_record):
+            with self._lock:
+                self._in_use[engine] -= 1
+
+    def choose(self):
+        """
+        Return engine of the replica to read from.
+
+        :return:
+        """
+        with self._lock:
+            start = self._turn % len(self.engines)
+            self._turn += 1
+            engines = self.engines[start:] + self.engines[:start]
+            if self.balancing == BALANCING_LEAST_CONNECTIONS:
+                return min(engines, key=self._in_use.get)
+
+            return engines[0]
+
+    def get_stats(self):
+        """
+        Return connections in use and checkouts of every replica.
+
+        :return:
+        """
+        with self._lock:
+            return [{
+                'url': repr(engine.url),
+                'in_use': self._in_use[engine],
+                'checkouts': self._checkouts[engine],
+            } for engine in self.engines]
+
+
+def get_replica_uris(config):
+    """
+    Return URIs of read replicas from app config or environment.
+
+    DB_REPLICA_URIS is a list or a comma separated string.
+
+    :param config: app config.
+    :return:
+    """
+    uris = config.get('DB_REPLICA_URIS', os.environ.get('DB_REPLICA_URIS'))
+    if not uris:
+        return []
+
+    if isinstance(uris, str):
+        uris = uris.split(',')
+
+    return [uri.strip() for uri in uris if uri.strip()]
+
+
+def create_replica_router(config):
+    """
+    Return router of read replicas configured by given app config.
+
+    :param config: app config.
+    :return: router or None if no replica is configured.
+    """
+    uris = get_replica_uris(config)
+    if not uris:
+        return None
+
+    engines = [
+        create_engine(uri, **get_engine_options(config, uri)) for uri in uris
+    ]
+    return ReplicaRouter(engines, get_setting(config, 'DB_REPLICA_BALANCING'))
+
+
+def get_async_database_options(config, database_uri):
+    """
+    Return connection pool options of async database for given database.
+
+    The async pool holds as many connections as the engine pool may open.
+    Prepared statements are not cached in PgBouncer mode, as a transaction
+    mode pooler may run them on another server connection.
+
+    :param config: app config.
+    :param database_uri:
+    :return:
+    """
+    if make_url(database_uri).get_backend_name() == 'sqlite':
+        return {}
+
+    if get_setting(config, 'DB_POOL_MODE') == POOL_MODE_PGBOUNCER:
+        return {'statement_cache_size': 0}
+
+    pool_size = get_setting(config, 'DB_POOL_SIZE')
+    return {
+        'min_size': pool_size,
+        'max_size': pool_size + get_setting(config, 'DB_MAX_OVERFLOW'),
+    }
+
+
+def get_pool_stats():
+    """
+    Return statistics of connection pool of the current app.
+
+    :return:
+    """
+    pool = db.engine.pool
+    stats = {'pool': type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+        })
+
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            checkouts, wait_time = pool.checkouts, pool.wait_time
+            timeouts = pool.timeouts
+
+        stats.update({
+            'checkouts': checkouts,
+            'timeouts': timeouts,
+            'wait_seconds_total': wait_time,
+            'wait_seconds_average': wait_time / checkouts if checkouts else 0,
+        })
+
+    return stats
+
+
+def setup_db(app, database_uri=None):
     """
     Bind a flask application and a SQLAlchemy service.
 
+    The database is given database_uri, else SQLALCHEMY_DATABASE_URI of app
+    config, else the default trivia database. Connection pool is configured
+    by DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING and DB_POOL_MODE from app config or environment.
+    Read replicas are configured by DB_REPLICA_URIS and
+    DB_REPLICA_BALANCING.
+
+    No connection is opened, the schema is created or upgraded by
+    upgrade_db, run by the upgrade-db command.
+
     :param app:
     :param database_uri:
     :return:
     """
+    database_uri = database_uri or app.config.get(
+        "SQLALCHEMY_DATABASE_URI", get_database_path()
+    )
     app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = get_engine_options(
+        app.config, database_uri
+    )
+    app.extensions['db_replicas'] = create_replica_router(app.config)
     db.app = app
     db.init_app(app)
+
+
+def upgrade_db():
+    """
+    Create missing tables and bring the schema up to date with the models.
+
+    Every step checks the current schema first, so it is safe to run on
+    new databases, on databases restored from trivia.psql as well as on up
+    to date ones.
+
+    :return:
+    """
     db.create_all()
+    inspector = inspect(db.engine)
+
+    if db.engine.dialect.name == 'postgresql':
+        columns = {
+            column['name']: column for column in
+            inspector.get_columns(Question.__tablename__)
+        }
+        if not isinstance(columns['category']['type'], Integer):
+            db.engine.execute(
+                'ALTER TABLE questions ALTER COLUMN category '
+                'TYPE integer USING category::integer'
+            )
+
+        foreign_keys = inspector.get_foreign_keys(Question.__tablename__)
+        if not any(foreign_key['referred_table'] == Category.__tablename__
+                   for foreign_key in foreign_keys):
+            db.engine.execute(
+                'ALTER TABLE questions ADD CONSTRAINT category '
+                'FOREIGN KEY (category) REFERENCES categories (id) '
+                'ON UPDATE CASCADE ON DELETE SET NULL'
+            )
+
+    index_names = {
+        index['name'] for index in
+        inspector.get_indexes(Question.__tablename__)
+    }
+    for index in Question.__table__.indexes:
+        if index.name not in index_names:
+            index.create(bind=db.engine)
+
+    create_search_indexes()
+    create_table_version_triggers()
+
+
+def create_search_indexes():
+    """
+    Create full-text and trigram search indexes of questions.
+
+    Indexes are only supported on PostgreSQL and are created if missing, so
+    it is safe to call on existing databases.
+
+    :return:
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+
+    for ddl in question_search_indexes:
+        db.engine.execute(ddl)
+
+
+def create_table_version_triggers():
+    """
+    Create version rows of versioned tables and triggers bumping them.
+
+    Every statement writing a versioned table bumps its version in the same
+    transaction, so versions change with writes of any process, of the CLI
+    and of direct SQL alike. Safe to call on up to date databases.
+
+    :return:
+    """
+    existing = {
+        name for name, in TableVersion.query.with_entities(TableVersion.name)
+    }
+    for table in versioned_tables:
+        if table not in existing:
+            db.session.add(TableVersion(table))
+    db.session.commit()
+
+    dialect_name = db.engine.dialect.name
+    if dialect_name == 'postgresql':
+        db.engine.execute(bump_table_version_function)
+
+    for table in versioned_tables:
+        for ddl in get_table_version_triggers(table, dialect_name):
+            db.engine.execute(ddl)
 
 
 class Question(db.Model):
     """Question."""
 
     __tablename__ = 'questions'
+    __table_args__ = (
+        Index('ix_questions_category_id', 'category', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
+    category = Column(
+        Integer,
+        ForeignKey(
+            'categories.id', onupdate='CASCADE', ondelete='SET NULL'
+        )
+    )
     difficulty = Column(Integer)
 
     def __init__(self, question, answer, category, difficulty):
@@ -74,13 +530,59 @@ class Question(db.Model):
         db.session.commit()
 
     @staticmethod
-    def update():
+    def update(question_ids=None, **values):
         """
         Update method.
 
-        :return:
+        Commits changes of loaded questions, or sets given values of the
+        questions of given ids with one UPDATE statement.
+
+        :param question_ids: ids of questions updated in one statement.
+        :param values: column values, e.g. category or difficulty.
+        :return: number of updated questions or None.
         """
+        count = None
+        if question_ids is not None:
+            count = Question.query.filter(
+                Question.has_ids(question_ids)
+            ).update(values, synchronize_session=False)
+
         db.session.commit()
+        return count
+
+    @staticmethod
+    def delete_many(question_ids):
+        """
+        Delete questions of given ids with one DELETE statement.
+
+        :param question_ids:
+        :return: number of deleted questions.
+        """
+        count = Question.query.filter(
+            Question.has_ids(question_ids)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def has_ids(question_ids):
+        """
+        Return filter of questions of given ids.
+
+        PostgreSQL gets the ids as one array parameter, id = ANY(:ids), so
+        the statement is the same for any number of ids. Other databases
+        get id IN (...).
+
+        :param question_ids:
+        :return:
+        """
+        question_ids = list(question_ids)
+        if db.session.get_bind().dialect.name == 'postgresql':
+            return Question.id == any_(
+                bindparam('question_ids', question_ids, type_=ARRAY(Integer))
+            )
+
+        return Question.id.in_(question_ids)
 
     def delete(self):
         """
@@ -106,6 +608,44 @@ class Question(db.Model):
         }
 
 
+@dataclass(frozen=True)
+class QuestionRecord:
+    """
+    Read-only question row of a column query.
+
+    Serialized to the same JSON object as Question.format(), without the
+    instance state and identity map of the ORM.
+    """
+
+    __slots__ = ('id', 'question', 'answer', 'category', 'difficulty')
+
+    id: int
+    question: str
+    answer: str
+    category: int
+    difficulty: int
+
+    def format(self):
+        """
+        Format record the same way as the question model.
+
+        :return:
+        """
+        return {
+            'id': self.id,
+            'question': self.question,
+            'answer': self.answer,
+            'category': self.category,
+            'difficulty': self.difficulty
+        }
+
+
+question_columns = (
+    Question.id, Question.question, Question.answer, Question.category,
+    Question.difficulty
+)
+
+
 class Category(db.Model):
     """Category."""
 
@@ -122,6 +662,33 @@ class Category(db.Model):
         """
         self.type = category_type
 
+    def insert(self):
+        """
+        Insert method.
+
+        :return:
+        """
+        db.session.add(self)
+        db.session.commit()
+
+    @staticmethod
+    def update():
+        """
+        Update method.
+
+        :return:
+        """
+        db.session.commit()
+
+    def delete(self):
+        """
+        Delete method.
+
+        :return:
+        """
+        db.session.delete(self)
+        db.session.commit()
+
     def format(self):
         """
         Format method.
@@ -132,3 +699,141 @@ class Category(db.Model):
             'id': self.id,
             'type': self.type
         }
+
+
+class TableVersion(db.Model):
+    """
+    Version counter of a table.
+
+    Bumped by triggers of the table in the transaction of every write, so
+    all processes read the same versions.
+    """
+
+    __tablename__ = 'table_versions'
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    modified_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    def __init__(self, name):
+        """
+        Init method.
+
+        :param name: table name.
+        """
+        self.name = name
+        self.version = 0
+
+
+def get_table_versions(*tables):
+    """
+    Return versions and last modification times of given tables.
+
+    Tables without a version row, e.g. before upgrade_db ran, get version 0
+    modified now, so they never answer a conditional request by date.
+
+    :param tables: table names.
+    :return: dict of version and last_modified datetime by table.
+    """
+    entries = {
+        name: (version, modified_at)
+        for name, version, modified_at in TableVersion.query.with_entities(
+            TableVersion.name, TableVersion.version, TableVersion.modified_at
+        ).filter(TableVersion.name.in_(tables))
+    }
+    now = datetime.now(timezone.utc)
+    versions = {}
+    for table in tables:
+        version, modified_at = entries.get(table, (0, now))
+        if modified_at.tzinfo is None:
+            modified_at = modified_at.replace(tzinfo=timezone.utc)
+        versions[table] = (version, modified_at)
+
+    return versions
+
+
+def get_table_version(session, table, lock=False):
+    """
+    Return version of given table seen by the transaction of a session.
+
+    A locked version row is not bumped by other transactions until the
+    transaction of the session ends. SQLite has no row locks and only
+    reads it.
+
+    :param session:
+    :param table: table name.
+    :param lock: whether to lock the version row.
+    :return: version, 0 if the table has no version row.
+    """
+    query = session.query(TableVersion.version).filter(
+        TableVersion.name == table
+    )
+    if lock:
+        query = query.with_for_update()
+
+    version = query.scalar()
+    return version or 0
+
+
+question_search_vector = func.to_tsvector(
+    literal_column(f"'{search_config}'"), Question.question
+)
+
+question_search_indexes = [
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_questions_question_fts "
+        f"ON questions USING gin (to_tsvector('{search_config}', question))"
+    ),
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_questions_question_trgm "
+        "ON questions USING gin (question gin_trgm_ops)"
+    ),
+]
+
+versioned_tables = (Question.__tablename__, Category.__tablename__)
+
+bump_table_version_function = DDL(
+    "CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$ "
+    "BEGIN "
+    "UPDATE table_versions "
+    "SET version = version + 1, modified_at = clock_timestamp() "
+    "WHERE name = TG_TABLE_NAME; "
+    "RETURN NULL; "
+    "END $$ LANGUAGE plpgsql"
+)
+
+
+def get_table_version_triggers(table, dialect_name):
+    """
+    Return statements creating triggers bumping version of given table.
+
+    PostgreSQL bumps once per statement, SQLite only has row triggers and
+    bumps once per row.
+
+    :param table: table name.
+    :param dialect_name:
+    :return: list of DDL.
+    """
+    if dialect_name == 'postgresql':
+        return [
+            DDL(f"DROP TRIGGER IF EXISTS {table}_version ON {table}"),
+            DDL(
+                f"CREATE TRIGGER {table}_version "
+                f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+                "FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()"
+            ),
+        ]
+
+    return [
+        DDL(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_version_{operation} "
+            f"AFTER {operation} ON {table} BEGIN "
+            "UPDATE table_versions "
+            "SET version = version + 1, modified_at = CURRENT_TIMESTAMP "
+            f"WHERE name = '{table}'; END"
+        )
+        for operation in ('insert', 'update', 'delete')
+    ]
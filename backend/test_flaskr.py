@@ -1,32 +1,98 @@
 """Module for tests."""
 
+import csv
+import gzip
+import io
+import json
 import unittest
 
-from flask_sqlalchemy import SQLAlchemy
-
 from flaskr import create_app
+from flaskr.cache import RedisCacheBackend, ResponseCache
 from flaskr.constants import (
-    ERROR_MESSAGES, STATUS_BAD_REQUEST, STATUS_CREATED,
-    STATUS_METHOD_NOT_ALLOWED, STATUS_NOT_FOUND, STATUS_NO_CONTENT, STATUS_OK,
+    ERROR_MESSAGES, MAX_QUIZ_QUESTIONS, QUIZ_STRATEGIES, STATUS_BAD_REQUEST,
+    STATUS_CREATED, STATUS_FORBIDDEN, STATUS_METHOD_NOT_ALLOWED,
+    STATUS_NOT_FOUND, STATUS_NOT_MODIFIED, STATUS_NO_CONTENT, STATUS_OK,
+    STATUS_UNAUTHORIZED,
 )
+from flaskr.utils import get_questions_query
+
+from models import Category, Question, db, get_database_path, upgrade_db
+
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+try:
+    from flaskr.asgi import create_asgi_app
+    from starlette.testclient import TestClient
+except ImportError:
+    create_asgi_app = None
+
+
+class FakeRedis:
+    """In memory stand-in of a Redis client."""
+
+    def __init__(self):
+        """Init method."""
+        self.values = {}
+
+    def get(self, key):
+        """
+        Return value of given key.
+
+        :param key:
+        :return:
+        """
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        """
+        Set value of given key.
+
+        :param key:
+        :param value:
+        :param ex:
+        :return:
+        """
+        self.values[key] = value
+
+    def incr(self, key):
+        """
+        Increment value of given key.
 
-from models import get_database_path, setup_db
+        :param key:
+        :return:
+        """
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
 
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case."""
 
+    database_name = "trivia_test"
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Create missing tables and indexes of the test database once.
+
+        :return:
+        """
+        app = create_app(get_database_path(cls.database_name))
+        with app.app_context():
+            upgrade_db()
+
     def setUp(self):
         """
         Define test variables and initialize app.
 
         :return:
         """
-        self.app = create_app()
-        self.client = self.app.test_client
-        self.database_name = "trivia_test"
         self.database_path = get_database_path(self.database_name)
-        setup_db(self.app, self.database_path)
+        self.app = create_app(self.database_path)
+        self.app.config['ADMIN_TOKEN'] = 'admin-token'
+        self.client = self.app.test_client
+        self.admin_headers = {'Authorization': 'Bearer admin-token'}
 
         self.question = {
             "question": "Test 1",
@@ -35,12 +101,30 @@ class TriviaTestCase(unittest.TestCase):
             "difficulty": 1
         }
 
-        # binds the app to the current context
-        with self.app.app_context():
-            self.db = SQLAlchemy()
-            self.db.init_app(self.app)
-            # create all tables
-            self.db.create_all()
+    def test_create_app_without_database_success(self):
+        """
+        Success case of creating app from config without database queries.
+
+        :return:
+        """
+        class Config:
+            SQLALCHEMY_DATABASE_URI = self.database_path
+
+        statements = []
+
+        def count_statement(*args):
+            statements.append(args)
+
+        event.listen(Engine, 'before_cursor_execute', count_statement)
+        try:
+            app = create_app(Config)
+        finally:
+            event.remove(Engine, 'before_cursor_execute', count_statement)
+
+        self.assertEqual(statements, [])
+        self.assertEqual(
+            app.config['SQLALCHEMY_DATABASE_URI'], self.database_path
+        )
 
     def test_get_categories_success(self):
         """
@@ -54,6 +138,43 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(json_data.get('success'), True)
         self.assertTrue(len(json_data.get('categories')))
 
+    def test_category_cache_per_app_success(self):
+        """
+        Success test case for apps keeping their own category cache.
+
+        :return:
+        """
+        other_app = create_app(self.database_path)
+        response = self.client().get('/categories')
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertFalse(self.app.extensions['category_cache'].expired)
+        self.assertTrue(other_app.extensions['category_cache'].expired)
+
+    def test_get_categories_cache_invalidated_success(self):
+        """
+        Success test case for get categories after a category is written.
+
+        :return:
+        """
+        self.client().get('/categories')
+        with self.app.app_context():
+            category = Category('Test Category')
+            category.insert()
+            category_id = category.id
+
+        response = self.client().get('/categories')
+        json_data = response.get_json()
+        self.assertEqual(
+            json_data['categories'].get(str(category_id)), 'Test Category'
+        )
+
+        with self.app.app_context():
+            Category.query.get(category_id).delete()
+
+        response = self.client().get('/categories')
+        json_data = response.get_json()
+        self.assertNotIn(str(category_id), json_data['categories'])
+
     def test_get_categories_failed(self):
         """
         Fail test case for get categories route.
@@ -82,6 +203,111 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(len(json_data.get('questions')))
         self.assertTrue(json_data.get('total_questions'))
 
+    def test_get_questions_not_modified_success(self):
+        """
+        Success case for conditional get questions.
+
+        :return:
+        """
+        response = self.client().get('/questions')
+        etag = response.headers.get('ETag')
+        self.assertTrue(etag)
+        self.assertIn('max-age', response.headers.get('Cache-Control'))
+
+        response = self.client().get(
+            '/questions', headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, STATUS_NOT_MODIFIED)
+        self.assertFalse(response.get_data())
+
+        self.client().post('/questions', json=self.question)
+        response = self.client().get(
+            '/questions', headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertNotEqual(response.headers.get('ETag'), etag)
+
+    def test_get_questions_etag_shared_success(self):
+        """
+        Success case for ETags of apps sharing the database.
+
+        A write through one app or in plain SQL changes the ETag of another.
+
+        :return:
+        """
+        other_client = create_app(self.database_path).test_client
+        etag = other_client().get('/questions').headers.get('ETag')
+
+        self.client().post('/questions', json=self.question)
+        response = other_client().get(
+            '/questions', headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertNotEqual(response.headers.get('ETag'), etag)
+
+        etag = response.headers.get('ETag')
+        with self.app.app_context():
+            db.session.execute(
+                Question.__table__.insert().values(**self.question)
+            )
+            db.session.commit()
+
+        response = other_client().get(
+            '/questions', headers={'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertNotEqual(response.headers.get('ETag'), etag)
+
+    def test_get_questions_shared_body_success(self):
+        """
+        Success case for bodies of apps sharing the database.
+
+        Cached responses, categories and question counts of an app follow
+        writes of another app, so an ETag always has the same body.
+
+        :return:
+        """
+        other_app = create_app(self.database_path)
+        other_client = other_app.test_client
+        response = other_client().get('/questions')
+        total_questions = response.get_json()['total_questions']
+
+        self.client().post('/questions', json=self.question)
+        expected = self.client().get('/questions')
+        response = other_client().get(
+            '/questions', headers={'If-None-Match': response.headers['ETag']}
+        )
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(response.headers['ETag'], expected.headers['ETag'])
+        self.assertEqual(
+            response.get_json()['total_questions'], total_questions + 1
+        )
+
+        with self.app.app_context():
+            category = Category('Shared')
+            category.insert()
+
+        response = other_client().get('/categories')
+        self.assertIn('Shared', response.get_json()['categories'].values())
+
+        with self.app.app_context():
+            category.delete()
+
+    def test_question_index_own_write_success(self):
+        """
+        Success case for question index applying writes of its own app.
+
+        :return:
+        """
+        question_index = self.app.extensions['question_index']
+        self.client().get('/questions')
+        built_at = question_index.built_at
+
+        response = self.client().post('/questions', json=self.question)
+        self.assertEqual(response.status_code, STATUS_CREATED)
+        self.client().get('/questions')
+        self.assertEqual(question_index.built_at, built_at)
+
     def test_get_questions_failed(self):
         """
         Fail case for get questions.
@@ -96,6 +322,44 @@ class TriviaTestCase(unittest.TestCase):
             json_data.get('message'), ERROR_MESSAGES[STATUS_NOT_FOUND]
         )
 
+    def test_get_questions_cursor_success(self):
+        """
+        Success case for get questions with cursor pagination.
+
+        :return:
+        """
+        response = self.client().get('/questions?after_id=0&limit=2')
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data.get('success'), True)
+        self.assertEqual(len(json_data.get('questions')), 2)
+        self.assertEqual(
+            json_data.get('next_cursor'), json_data['questions'][-1]['id']
+        )
+
+        response = self.client().get(
+            f'/questions?after_id={json_data.get("next_cursor")}&limit=2'
+        )
+        next_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertGreater(
+            next_data['questions'][0]['id'], json_data['next_cursor']
+        )
+
+    def test_get_questions_cursor_failed_bad_request(self):
+        """
+        Fail case for get questions with invalid cursor.
+
+        :return:
+        """
+        response = self.client().get('/questions?after_id=abc')
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
+        self.assertEqual(json_data.get('success'), False)
+        self.assertEqual(
+            json_data.get('message'), ERROR_MESSAGES[STATUS_BAD_REQUEST]
+        )
+
     def test_delete_question_success(self):
         """
         Success case of delete question test case.
@@ -107,6 +371,108 @@ class TriviaTestCase(unittest.TestCase):
         response = self.client().delete(f'/questions/{json_data.get("id")}')
         self.assertEqual(response.status_code, STATUS_NO_CONTENT)
 
+    def test_bulk_update_delete_questions_success(self):
+        """
+        Success case of bulk update and bulk delete of questions.
+
+        :return:
+        """
+        question_ids = [
+            self.client().post(
+                '/questions', json=self.question
+            ).get_json().get('id')
+            for _ in range(3)
+        ]
+        response = self.client().patch('/questions/bulk', json={
+            'ids': question_ids,
+            'category': 2,
+            'difficulty': 5
+        })
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data.get('updated'), 3)
+        with self.app.app_context():
+            questions = Question.query.filter(Question.id.in_(question_ids))
+            for question in questions:
+                self.assertEqual(question.category, 2)
+                self.assertEqual(question.difficulty, 5)
+
+        response = self.client().delete('/questions/bulk', json={
+            'ids': question_ids + [question_ids[0]]
+        })
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data.get('deleted'), 3)
+
+        response = self.client().get(
+            '/questions/index?check=1', headers=self.admin_headers
+        )
+        self.assertTrue(response.get_json()['check']['consistent'])
+
+    def test_question_index_failed_unauthorized(self):
+        """
+        Fail case of question index without the admin token.
+
+        :return:
+        """
+        for headers in ({}, {'Authorization': 'Bearer wrong'}):
+            response = self.client().post('/questions/index', headers=headers)
+            json_data = response.get_json()
+            self.assertEqual(response.status_code, STATUS_UNAUTHORIZED)
+            self.assertEqual(json_data.get('success'), False)
+
+        self.app.config['ADMIN_TOKEN'] = None
+        response = self.client().get(
+            '/questions/index', headers=self.admin_headers
+        )
+        self.assertEqual(response.status_code, STATUS_FORBIDDEN)
+
+    def test_question_index_without_check_success(self):
+        """
+        Success case of question index counts without the database check.
+
+        :return:
+        """
+        response = self.client().get(
+            '/questions/index', headers=self.admin_headers
+        )
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertTrue(json_data['index']['total_questions'])
+        self.assertNotIn('check', json_data)
+
+    def test_bulk_update_difficulty_invalidation_success(self):
+        """
+        Success case of bulk update of difficulty invalidating categories.
+
+        Only categories of the updated questions are invalidated.
+
+        :return:
+        """
+        question_id = self.client().post(
+            '/questions', json=self.question
+        ).get_json().get('id')
+        response = self.client().patch('/questions/bulk', json={
+            'ids': [question_id],
+            'difficulty': 2
+        })
+        self.assertEqual(response.status_code, STATUS_OK)
+
+        backend = self.app.extensions['response_cache'].backend
+        self.assertTrue(backend.get('generation:category:1'))
+        self.assertIsNone(backend.get('generation:category:None'))
+
+    def test_bulk_update_questions_failed_bad_request(self):
+        """
+        Fail case of bulk update of questions without values.
+
+        :return:
+        """
+        response = self.client().patch('/questions/bulk', json={'ids': [1]})
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
+        self.assertEqual(json_data.get('success'), False)
+
     def test_delete_question_failed_method_not_allowed(self):
         """
         Method not allowed failed case of delete question test case.
@@ -175,110 +541,421 @@ class TriviaTestCase(unittest.TestCase):
             json_data.get('message'), ERROR_MESSAGES[STATUS_BAD_REQUEST]
         )
 
-    def test_search_questions_success(self):
+    def test_bulk_add_questions_success(self):
         """
-        Success case of search questions api.
+        Success case of bulk add questions with an invalid row.
 
         :return:
         """
-        data = {
-            "searchTerm": "The"
-        }
-        response = self.client().post('/questions/filter', json=data)
+        questions = [self.question, dict(self.question, category=-1)]
+        response = self.client().post('/questions/bulk', json=questions)
         json_data = response.get_json()
-        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(response.status_code, STATUS_CREATED)
         self.assertEqual(json_data.get('success'), True)
-        self.assertTrue(len(json_data.get('questions')))
-        self.assertTrue(json_data.get('total_questions'))
+        self.assertEqual(json_data.get('inserted'), 1)
+        self.assertEqual(json_data.get('failed'), 1)
+        self.assertEqual(json_data['errors'][0]['row'], 2)
 
-    def test_search_questions_failed(self):
+    def test_bulk_add_questions_zero_difficulty_success(self):
         """
-        Success case of search questions api with method not allowed error.
+        Success case of bulk add questions with a difficulty of 0.
 
         :return:
         """
-        response = self.client().get('/questions/filter', json={})
+        questions = [dict(self.question, difficulty=0)]
+        response = self.client().post('/questions/bulk', json=questions)
         json_data = response.get_json()
-        self.assertEqual(response.status_code, STATUS_METHOD_NOT_ALLOWED)
-        self.assertEqual(json_data.get('success'), False)
-        self.assertEqual(
-            json_data.get('message'), ERROR_MESSAGES[STATUS_METHOD_NOT_ALLOWED]
-        )
+        self.assertEqual(response.status_code, STATUS_CREATED)
+        self.assertEqual(json_data.get('inserted'), 1)
+        self.assertEqual(json_data.get('failed'), 0)
 
-    def test_get_questions_by_category_success(self):
+    def test_bulk_add_questions_database_error_success(self):
         """
-        Success case for get questions by category.
+        Success case of bulk add questions with a row rejected by database.
+
+        Only the rejected row is reported, the rest of its batch is inserted.
 
         :return:
         """
-        response = self.client().get('/categories/1/questions')
+        with self.app.app_context():
+            if db.engine.dialect.name != 'postgresql':
+                self.skipTest('Integer range is only checked on PostgreSQL')
+
+        questions = [self.question] * 3 + [
+            dict(self.question, difficulty=2 ** 31)
+        ] + [self.question] * 2
+        response = self.client().post('/questions/bulk', json=questions)
         json_data = response.get_json()
-        self.assertEqual(response.status_code, STATUS_OK)
-        self.assertEqual(json_data.get('success'), True)
-        self.assertTrue(len(json_data.get('questions')))
-        self.assertTrue(json_data.get('total_questions'))
-        self.assertTrue(len(json_data.get('current_category')))
+        self.assertEqual(response.status_code, STATUS_CREATED)
+        self.assertEqual(json_data.get('inserted'), 5)
+        self.assertEqual(json_data.get('failed'), 1)
+        self.assertEqual(json_data['errors'][0]['row'], 4)
 
-    def test_get_questions_by_category_failed_method_not_allowed(self):
+    def test_bulk_add_questions_invalid_utf8_success(self):
         """
-        Fail case for get questions by category with method not allowed error.
+        Success case of bulk add questions with invalid UTF-8 in the body.
+
+        Rows before the invalid line are inserted and reported.
 
         :return:
         """
-        response = self.client().post('/categories/1/questions')
-        json_data = response.get_json()
-        self.assertEqual(response.status_code, STATUS_METHOD_NOT_ALLOWED)
-        self.assertEqual(json_data.get('success'), False)
-        self.assertEqual(
-            json_data.get('message'), ERROR_MESSAGES[STATUS_METHOD_NOT_ALLOWED]
+        line = json.dumps(self.question).encode()
+        body = b'\n'.join([line, line, b'{"question": "\xff"}', line])
+        response = self.client().post(
+            '/questions/bulk', data=body,
+            content_type='application/x-ndjson'
         )
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_CREATED)
+        self.assertEqual(json_data.get('inserted'), 2)
+        self.assertEqual(json_data.get('failed'), 1)
+        self.assertEqual(json_data['errors'][0]['row'], 3)
 
-    def test_get_questions_by_category_not_found(self):
+    def test_bulk_add_questions_failed_bad_request(self):
         """
-        Fail case for get questions by category with method not found.
+        Fail case of bulk add questions with a body which is not an array.
 
         :return:
         """
-        response = self.client().get('/categories/1000/questions')
+        response = self.client().post('/questions/bulk', json=self.question)
         json_data = response.get_json()
-        self.assertEqual(response.status_code, STATUS_NOT_FOUND)
+        self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
         self.assertEqual(json_data.get('success'), False)
         self.assertEqual(
-            json_data.get('message'), ERROR_MESSAGES[STATUS_NOT_FOUND]
+            json_data.get('message'), ERROR_MESSAGES[STATUS_BAD_REQUEST]
         )
 
-    def test_play_quiz_success(self):
+    def test_search_questions_success(self):
         """
-        Success case for play quiz api.
+        Success case of search questions api.
 
         :return:
         """
         data = {
-            "quiz_category": {
-                "id": 1
-            },
-            "previous_questions": []
+            "searchTerm": "The"
         }
-        response = self.client().post('/quizzes', json=data)
+        response = self.client().post('/questions/filter', json=data)
         json_data = response.get_json()
         self.assertEqual(response.status_code, STATUS_OK)
         self.assertEqual(json_data.get('success'), True)
-        self.assertTrue(len(json_data.get('question')))
+        self.assertTrue(len(json_data.get('questions')))
+        self.assertTrue(json_data.get('total_questions'))
 
-    def test_play_quiz_failed_method_not_allowed(self):
+    def test_search_questions_fulltext_success(self):
         """
-        Fail case for play quiz api with method not allowed error.
+        Success case of search questions api in full-text mode.
 
         :return:
         """
-        response = self.client().get('/quizzes', json={})
+        data = {
+            "searchTerm": "palace",
+            "searchMode": "fulltext"
+        }
+        response = self.client().post('/questions/filter', json=data)
         json_data = response.get_json()
-        self.assertEqual(response.status_code, STATUS_METHOD_NOT_ALLOWED)
-        self.assertEqual(json_data.get('success'), False)
-        self.assertEqual(
-            json_data.get('message'), ERROR_MESSAGES[STATUS_METHOD_NOT_ALLOWED]
-        )
-
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data.get('success'), True)
+        self.assertTrue(len(json_data.get('questions')))
+        self.assertIn('palace', json_data['questions'][0]['question'].lower())
+
+    def test_search_questions_failed_bad_request(self):
+        """
+        Fail case of search questions api with unknown search mode.
+
+        :return:
+        """
+        data = {
+            "searchTerm": "The",
+            "searchMode": "unknown"
+        }
+        response = self.client().post('/questions/filter', json=data)
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
+        self.assertEqual(json_data.get('success'), False)
+        self.assertEqual(
+            json_data.get('message'), ERROR_MESSAGES[STATUS_BAD_REQUEST]
+        )
+
+    def test_search_questions_paginated_success(self):
+        """
+        Success case of search questions api with pagination.
+
+        :return:
+        """
+        data = {
+            "searchTerm": "The",
+            "page": 1,
+            "limit": 2
+        }
+        response = self.client().post('/questions/filter', json=data)
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data.get('success'), True)
+        self.assertEqual(len(json_data.get('questions')), 2)
+        self.assertGreater(json_data.get('total_questions'), 2)
+
+    def test_search_questions_failed(self):
+        """
+        Success case of search questions api with method not allowed error.
+
+        :return:
+        """
+        response = self.client().get('/questions/filter', json={})
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_METHOD_NOT_ALLOWED)
+        self.assertEqual(json_data.get('success'), False)
+        self.assertEqual(
+            json_data.get('message'), ERROR_MESSAGES[STATUS_METHOD_NOT_ALLOWED]
+        )
+
+    def test_get_questions_by_category_success(self):
+        """
+        Success case for get questions by category.
+
+        :return:
+        """
+        response = self.client().get('/categories/1/questions')
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data.get('success'), True)
+        self.assertTrue(len(json_data.get('questions')))
+        self.assertTrue(json_data.get('total_questions'))
+        self.assertTrue(len(json_data.get('current_category')))
+
+    def test_get_questions_by_category_cursor_success(self):
+        """
+        Success case for get questions by category with cursor pagination.
+
+        :return:
+        """
+        response = self.client().get(
+            '/categories/1/questions?after_id=0&limit=1'
+        )
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data.get('success'), True)
+        self.assertEqual(len(json_data.get('questions')), 1)
+        self.assertEqual(
+            json_data.get('next_cursor'), json_data['questions'][0]['id']
+        )
+
+    def test_get_questions_by_category_ndjson_success(self):
+        """
+        Success case for streaming questions by category as NDJSON.
+
+        :return:
+        """
+        response = self.client().get(
+            '/categories/1/questions',
+            headers={'Accept': 'application/x-ndjson'}
+        )
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertTrue(len(lines))
+        self.assertTrue(all(json.loads(line).get('id') for line in lines))
+
+    def test_export_questions_success(self):
+        """
+        Success case for exporting questions of a category as NDJSON and CSV.
+
+        :return:
+        """
+        response = self.client().get('/questions/export?category=1')
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertTrue(len(lines))
+        self.assertTrue(
+            all(json.loads(line).get('category') == 1 for line in lines)
+        )
+
+        response = self.client().get(
+            '/questions/export?category=1&format=csv',
+            headers={'Accept-Encoding': 'gzip'}
+        )
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        rows = list(csv.DictReader(
+            io.StringIO(gzip.decompress(response.data).decode())
+        ))
+        self.assertEqual(len(rows), len(lines))
+        self.assertEqual(
+            [int(row['id']) for row in rows],
+            [json.loads(line)['id'] for line in lines]
+        )
+
+    def test_export_questions_failed_bad_request(self):
+        """
+        Fail case for exporting questions in an unknown format.
+
+        :return:
+        """
+        response = self.client().get('/questions/export?format=xml')
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
+        self.assertEqual(json_data.get('success'), False)
+
+    def test_get_questions_by_category_failed_method_not_allowed(self):
+        """
+        Fail case for get questions by category with method not allowed error.
+
+        :return:
+        """
+        response = self.client().post('/categories/1/questions')
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_METHOD_NOT_ALLOWED)
+        self.assertEqual(json_data.get('success'), False)
+        self.assertEqual(
+            json_data.get('message'), ERROR_MESSAGES[STATUS_METHOD_NOT_ALLOWED]
+        )
+
+    def test_get_questions_by_category_not_found(self):
+        """
+        Fail case for get questions by category with method not found.
+
+        :return:
+        """
+        response = self.client().get('/categories/1000/questions')
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_NOT_FOUND)
+        self.assertEqual(json_data.get('success'), False)
+        self.assertEqual(
+            json_data.get('message'), ERROR_MESSAGES[STATUS_NOT_FOUND]
+        )
+
+    def test_play_quiz_success(self):
+        """
+        Success case for play quiz api.
+
+        :return:
+        """
+        data = {
+            "quiz_category": {
+                "id": 1
+            },
+            "previous_questions": []
+        }
+        response = self.client().post('/quizzes', json=data)
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data.get('success'), True)
+        self.assertTrue(len(json_data.get('question')))
+
+    def test_play_quiz_excludes_previous_questions_success(self):
+        """
+        Success case for play quiz api skipping previous questions.
+
+        :return:
+        """
+        previous_questions = []
+        while True:
+            data = {
+                "quiz_category": {
+                    "id": 1
+                },
+                "previous_questions": previous_questions
+            }
+            response = self.client().post('/quizzes', json=data)
+            json_data = response.get_json()
+            self.assertEqual(response.status_code, STATUS_OK)
+
+            question = json_data.get('question')
+            if question is None:
+                break
+
+            self.assertNotIn(question['id'], previous_questions)
+            previous_questions.append(question['id'])
+
+        self.assertTrue(len(previous_questions))
+
+    def test_play_quiz_batch_success(self):
+        """
+        Success case for play quiz api asking several questions at once.
+
+        :return:
+        """
+        response = self.client().post(
+            '/questions/index', headers=self.admin_headers
+        )
+        total_questions = response.get_json()['index']['categories']['1']
+        data = {
+            "quiz_category": {
+                "id": 1
+            },
+            "previous_questions": [],
+            "count": total_questions + 1
+        }
+        response = self.client().post('/quizzes', json=data)
+        json_data = response.get_json()
+        question_ids = [
+            question['id'] for question in json_data.get('questions')
+        ]
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(len(question_ids), total_questions)
+        self.assertEqual(len(set(question_ids)), total_questions)
+
+        data['previous_questions'] = question_ids[:1]
+        data['count'] = 2
+        response = self.client().post('/quizzes', json=data)
+        json_data = response.get_json()
+        self.assertEqual(len(json_data.get('questions')), 2)
+        self.assertNotIn(
+            question_ids[0],
+            [question['id'] for question in json_data.get('questions')]
+        )
+
+        data['count'] = 0
+        response = self.client().post('/quizzes', json=data)
+        self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
+
+    def test_play_quiz_difficulty_strategy_success(self):
+        """
+        Success case for play quiz api within difficulty by each strategy.
+
+        :return:
+        """
+        for strategy in QUIZ_STRATEGIES:
+            data = {
+                "quiz_category": {
+                    "id": 0
+                },
+                "previous_questions": [],
+                "difficulty": {"min": 2, "max": 3},
+                "strategy": strategy,
+                "count": MAX_QUIZ_QUESTIONS
+            }
+            response = self.client().post('/quizzes', json=data)
+            json_data = response.get_json()
+            questions = json_data.get('questions')
+            self.assertEqual(response.status_code, STATUS_OK)
+            self.assertTrue(len(questions))
+            self.assertEqual(
+                len({question['id'] for question in questions}),
+                len(questions)
+            )
+            for question in questions:
+                self.assertIn(question['difficulty'], (2, 3))
+
+        data['strategy'] = 'unknown'
+        response = self.client().post('/quizzes', json=data)
+        self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
+
+    def test_play_quiz_failed_method_not_allowed(self):
+        """
+        Fail case for play quiz api with method not allowed error.
+
+        :return:
+        """
+        response = self.client().get('/quizzes', json={})
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_METHOD_NOT_ALLOWED)
+        self.assertEqual(json_data.get('success'), False)
+        self.assertEqual(
+            json_data.get('message'), ERROR_MESSAGES[STATUS_METHOD_NOT_ALLOWED]
+        )
+
     def test_play_quiz_failed_bad_request(self):
         """
         Fail case for play quiz api with method bad request.
@@ -293,6 +970,497 @@ class TriviaTestCase(unittest.TestCase):
             json_data.get('message'), ERROR_MESSAGES[STATUS_BAD_REQUEST]
         )
 
+    def test_play_quiz_failed_bad_request_ids(self):
+        """
+        Fail case for play quiz and quiz session apis with non integer ids.
+
+        :return:
+        """
+        for path, data in (
+                ('/quizzes', {
+                    'quiz_category': {'id': 1},
+                    'previous_questions': ['a']
+                }),
+                ('/quizzes', {'quiz_category': {'id': 'abc'}}),
+                ('/quizzes/sessions', {'quiz_category': {'id': 'abc'}})):
+            response = self.client().post(path, json=data)
+            json_data = response.get_json()
+            self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
+            self.assertEqual(json_data.get('success'), False)
+
+        response = self.client().post('/quizzes', json={
+            'quiz_category': {'id': '1'},
+            'previous_questions': []
+        })
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(response.get_json()['question']['category'], 1)
+
+    @unittest.skipIf(create_asgi_app is None, 'ASGI packages not installed')
+    def test_asgi_play_quiz_failed_bad_request_ids(self):
+        """
+        Fail case for ASGI play quiz api with non integer ids.
+
+        :return:
+        """
+        asgi_app = create_asgi_app({
+            'SQLALCHEMY_DATABASE_URI': self.database_path
+        })
+        with TestClient(asgi_app) as asgi_client:
+            for path, data in (
+                    ('/quizzes', {
+                        'quiz_category': {'id': 1},
+                        'previous_questions': ['a']
+                    }),
+                    ('/quizzes', {'quiz_category': {'id': 'abc'}})):
+                response = asgi_client.post(path, json=data)
+                self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
+
+    def test_quiz_session_success(self):
+        """
+        Success case for playing quiz through a quiz session.
+
+        :return:
+        """
+        data = {
+            "quiz_category": {
+                "id": 1
+            }
+        }
+        response = self.client().post('/quizzes/sessions', json=data)
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_CREATED)
+        self.assertEqual(json_data.get('success'), True)
+        self.assertTrue(json_data.get('total_questions'))
+
+        session_id = json_data.get('session_id')
+        total_questions = json_data.get('total_questions')
+        question_ids = set()
+        for _ in range(total_questions):
+            response = self.client().post(f'/quizzes/{session_id}/next')
+            json_data = response.get_json()
+            self.assertEqual(response.status_code, STATUS_OK)
+            question_ids.add(json_data['question']['id'])
+
+        self.assertEqual(json_data.get('remaining_questions'), 0)
+        self.assertEqual(len(question_ids), total_questions)
+
+        response = self.client().delete(f'/quizzes/{session_id}')
+        self.assertEqual(response.status_code, STATUS_NO_CONTENT)
+
+    def test_quiz_sessions_share_question_ids_success(self):
+        """
+        Success case for quiz sessions of a category sharing question ids.
+
+        :return:
+        """
+        data = {
+            "quiz_category": {
+                "id": 1
+            }
+        }
+        quiz_sessions = self.app.extensions['quiz_sessions']
+        sessions = [
+            quiz_sessions.get(
+                self.client().post(
+                    '/quizzes/sessions', json=data
+                ).get_json().get('session_id')
+            )
+            for _ in range(2)
+        ]
+        self.assertIs(sessions[0].question_ids, sessions[1].question_ids)
+        self.assertEqual(
+            sorted(
+                sessions[0].next_question_id()
+                for _ in range(sessions[0].remaining)
+            ),
+            sorted(sessions[1].question_ids)
+        )
+
+    def test_quiz_session_failed_not_found(self):
+        """
+        Fail case for quiz session with unknown session id.
+
+        :return:
+        """
+        response = self.client().post('/quizzes/unknown/next')
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_NOT_FOUND)
+        self.assertEqual(json_data.get('success'), False)
+        self.assertEqual(
+            json_data.get('message'), ERROR_MESSAGES[STATUS_NOT_FOUND]
+        )
+
+    def test_response_cache_redis_backend_success(self):
+        """
+        Success case for cached category questions invalidated by a write.
+
+        :return:
+        """
+        response_cache = ResponseCache(RedisCacheBackend(FakeRedis()))
+        self.app.extensions['response_cache'] = response_cache
+
+        json_data = self.client().get('/categories/1/questions').get_json()
+        cached_data = self.client().get('/categories/1/questions').get_json()
+        self.assertEqual(json_data, cached_data)
+        self.assertEqual(response_cache.hits, 1)
+
+        self.client().post('/questions', json=self.question)
+        response = self.client().get('/categories/1/questions')
+        self.assertEqual(
+            response.get_json().get('total_questions'),
+            json_data.get('total_questions') + 1
+        )
+
+        response = self.client().get('/metrics/cache')
+        stats = response.get_json().get('cache')
+        self.assertEqual(stats.get('hits'), 1)
+        self.assertEqual(stats.get('misses'), 2)
+
+    def test_question_index_success(self):
+        """
+        Success case of question index following added and deleted questions.
+
+        :return:
+        """
+        response = self.client().post('/questions', json=self.question)
+        question_id = response.get_json().get('id')
+        response = self.client().get(
+            '/questions/index?check=1', headers=self.admin_headers
+        )
+        json_data = response.get_json()
+        total_questions = json_data['index']['total_questions']
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertTrue(json_data['check']['consistent'])
+
+        self.client().delete(f'/questions/{question_id}')
+        response = self.client().get(
+            '/questions/index?check=1', headers=self.admin_headers
+        )
+        json_data = response.get_json()
+        self.assertTrue(json_data['check']['consistent'])
+        self.assertEqual(
+            json_data['index']['total_questions'], total_questions - 1
+        )
+
+        response = self.client().post(
+            '/questions/index', headers=self.admin_headers
+        )
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(
+            json_data['index']['total_questions'], total_questions - 1
+        )
+
+    def test_question_index_string_fields_success(self):
+        """
+        Success case of question index following a question posted by a form.
+
+        Forms post category and difficulty as strings.
+
+        :return:
+        """
+        response = self.client().get(
+            '/questions/index', headers=self.admin_headers
+        )
+        total_questions = response.get_json()['index']['categories']['2']
+
+        self.client().post('/questions', json=dict(
+            self.question, category='2', difficulty='3'
+        ))
+        response = self.client().get(
+            '/questions/index?check=1', headers=self.admin_headers
+        )
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertTrue(json_data['check']['consistent'])
+        self.assertEqual(
+            json_data['index']['categories']['2'], total_questions + 1
+        )
+
+        response = self.client().post('/quizzes', json={
+            'quiz_category': {'id': 0},
+            'previous_questions': [],
+            'difficulty': 3
+        })
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(response.get_json()['question']['difficulty'], 3)
+
+    def test_get_metrics_success(self):
+        """
+        Success case for Prometheus metrics and Server-Timing header.
+
+        :return:
+        """
+        response = self.client().get('/questions')
+        self.assertIn('db;dur=', response.headers.get('Server-Timing'))
+
+        response = self.client().get('/metrics')
+        metrics = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn(
+            'trivia_request_duration_seconds_count{route="/questions"',
+            metrics
+        )
+        self.assertIn('trivia_request_sql_statements_bucket', metrics)
+
+    def test_get_metrics_streamed_success(self):
+        """
+        Success case for metrics of SQL statements of a streamed response.
+
+        :return:
+        """
+        response = self.client().get('/questions/export')
+        self.assertTrue(response.is_streamed)
+        response.get_data()
+        response.close()
+
+        metrics = self.client().get('/metrics').get_data(as_text=True)
+        labels = 'route="/questions/export",method="GET"'
+        self.assertIn(
+            f'trivia_request_sql_statements_count{{{labels}}} 1', metrics
+        )
+        self.assertNotIn(
+            f'trivia_request_sql_statements_sum{{{labels}}} 0', metrics
+        )
+
+    def test_get_pool_metrics_success(self):
+        """
+        Success case for connection pool metrics.
+
+        :return:
+        """
+        self.client().get('/questions')
+        response = self.client().get('/metrics/pool')
+        json_data = response.get_json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data.get('success'), True)
+        self.assertEqual(json_data['pool'].get('pool'), 'TimedQueuePool')
+        self.assertTrue(json_data['pool'].get('checkouts'))
+
+    def test_read_replica_success(self):
+        """
+        Success test case for reads from replica and writes to primary.
+
+        :return:
+        """
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': self.database_path,
+            'DB_REPLICA_URIS': [self.database_path],
+        })
+        client = app.test_client()
+        replicas = app.extensions['db_replicas']
+
+        response = client.get('/questions?page=1')
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(replicas.get_stats()[0]['checkouts'], 1)
+
+        response = client.post('/questions', json=self.question)
+        self.assertEqual(response.status_code, STATUS_CREATED)
+        self.assertIn('trivia_last_write', response.headers['Set-Cookie'])
+
+        client.get('/questions?page=1')
+        self.assertEqual(replicas.get_stats()[0]['checkouts'], 1)
+
+        with app.app_context():
+            Question.query.get(response.get_json()['id']).delete()
+
+    def test_read_replica_bulk_add_success(self):
+        """
+        Success test case for last write cookie of bulk add questions.
+
+        :return:
+        """
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': self.database_path,
+            'DB_REPLICA_URIS': [self.database_path],
+        })
+        response = app.test_client().post(
+            '/questions/bulk', json=[self.question]
+        )
+        self.assertEqual(response.status_code, STATUS_CREATED)
+        self.assertEqual(response.get_json().get('inserted'), 1)
+        self.assertIn('trivia_last_write', response.headers['Set-Cookie'])
+
+    def test_read_replica_response_cache_success(self):
+        """
+        Success test case for response cache bypassed after a write.
+
+        :return:
+        """
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': self.database_path,
+            'DB_REPLICA_URIS': [self.database_path],
+        })
+        response_cache = app.extensions['response_cache']
+        app.test_client().get('/questions?page=1')
+        self.assertEqual(response_cache.misses, 1)
+
+        client = app.test_client()
+        response = client.post('/questions', json=self.question)
+        self.assertIn('trivia_last_write', response.headers['Set-Cookie'])
+        client.get('/questions?page=1')
+        client.get('/questions?page=1')
+        self.assertEqual(response_cache.hits, 0)
+        self.assertEqual(response_cache.misses, 1)
+
+    def test_search_questions_gzip_success(self):
+        """
+        Success test case for search response compressed with gzip.
+
+        :return:
+        """
+        search = {'searchTerm': 'The'}
+        expected = self.client().post('/questions/filter', json=search)
+        for _ in range(2):
+            response = self.client().post(
+                '/questions/filter', json=search,
+                headers={'Accept-Encoding': 'gzip'}
+            )
+            self.assertEqual(response.status_code, STATUS_OK)
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertIn('Accept-Encoding', response.vary)
+            self.assertEqual(
+                json.loads(gzip.decompress(response.get_data())),
+                expected.get_json()
+            )
+
+    def test_json_providers_same_response_success(self):
+        """
+        Success test case for JSON providers serializing the same data.
+
+        :return:
+        """
+        responses = []
+        for provider in ('default', None):
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': self.database_path,
+                'JSON_PROVIDER': provider
+            })
+            response = app.test_client().post(
+                '/questions/filter', json={'searchTerm': 'The'}
+            )
+            self.assertEqual(response.status_code, STATUS_OK)
+            responses.append(response.get_json())
+
+        self.assertEqual(responses[0], responses[1])
+        self.assertTrue(responses[0]['total_questions'])
+
+    def test_json_providers_response_arguments_success(self):
+        """
+        Success test case for JSON providers serializing response arguments.
+
+        :return:
+        """
+        for provider in ('default', None):
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': self.database_path,
+                'JSON_PROVIDER': provider
+            })
+            with app.app_context():
+                self.assertEqual(app.json.response(1).get_json(), 1)
+                self.assertEqual(app.json.response(1, 2).get_json(), [1, 2])
+                self.assertEqual(app.json.response(a=1).get_json(), {'a': 1})
+                self.assertIsNone(app.json.response().get_json())
+                with self.assertRaises(TypeError):
+                    app.json.response(1, a=1)
+
+    @unittest.skipIf(create_asgi_app is None, 'ASGI packages not installed')
+    def test_asgi_app_same_responses_success(self):
+        """
+        Success test case for ASGI app returning the same JSON as WSGI app.
+
+        :return:
+        """
+        asgi_app = create_asgi_app({
+            'SQLALCHEMY_DATABASE_URI': self.database_path
+        })
+        with TestClient(asgi_app) as asgi_client:
+            for path in ('/categories', '/questions?page=1',
+                         '/categories/1/questions', '/questions?page=1000'):
+                response = asgi_client.get(path)
+                expected = self.client().get(path)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.get_json())
+
+            response = asgi_client.post('/quizzes', json={
+                'quiz_category': {'id': 1},
+                'previous_questions': []
+            })
+
+        json_data = response.json()
+        self.assertEqual(response.status_code, STATUS_OK)
+        self.assertEqual(json_data['question']['category'], 1)
+
+    @unittest.skipIf(create_asgi_app is None, 'ASGI packages not installed')
+    def test_asgi_add_question_failed_bad_request(self):
+        """
+        Fail case of ASGI add question with an id or an unknown field.
+
+        :return:
+        """
+        asgi_app = create_asgi_app({
+            'SQLALCHEMY_DATABASE_URI': self.database_path
+        })
+        with TestClient(asgi_app) as asgi_client:
+            for question in (dict(self.question, id=1),
+                             dict(self.question, unknown=1)):
+                response = asgi_client.post('/questions', json=question)
+                self.assertEqual(response.status_code, STATUS_BAD_REQUEST)
+                self.assertEqual(response.json().get('success'), False)
+
+            response = asgi_client.post('/questions', json=self.question)
+
+        self.assertEqual(response.status_code, STATUS_CREATED)
+        self.assertTrue(response.json().get('id'))
+
+    def get_query_plan(self, query):
+        """
+        Return EXPLAIN output of given query with sequential scans disabled.
+
+        The test database is tiny, so sequential scans are disabled to check
+        that the planner is able to use an index at all.
+
+        :param query:
+        :return:
+        """
+        if db.engine.dialect.name != 'postgresql':
+            self.skipTest('Query plans are only checked on PostgreSQL')
+
+        statement = query.statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}
+        )
+        db.session.execute('SET LOCAL enable_seqscan = off')
+        plan = db.session.execute(f'EXPLAIN {statement}').fetchall()
+        db.session.rollback()
+        return '\n'.join(row[0] for row in plan)
+
+    def test_questions_by_category_uses_index(self):
+        """
+        Questions of a category are read from the category index in order.
+
+        :return:
+        """
+        with self.app.app_context():
+            query = get_questions_query(category_id=1).limit(10)
+            plan = self.get_query_plan(query)
+
+        self.assertIn('ix_questions_category_id', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_count_questions_by_category_uses_index(self):
+        """
+        Questions of a category are counted from the category index.
+
+        :return:
+        """
+        with self.app.app_context():
+            query = get_questions_query(category_id=1).order_by(None)
+            query = query.with_entities(func.count(Question.id))
+            plan = self.get_query_plan(query)
+
+        self.assertIn('ix_questions_category_id', plan)
+
     def tearDown(self):
         """
         Execute after reach test.